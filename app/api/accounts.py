@@ -1,11 +1,24 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from sqlalchemy import exists
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, undefer
+from typing import List, Optional, get_args
 
 from app.db.database import get_db
-from app.models.models import Account, User
-from app.schemas.schemas import AccountCreate, AccountResponse, AccountBalance
-from app.core.auth import get_current_active_user
+from app.models.models import Account
+from app.schemas.schemas import AccountCreate, AccountResponse, AccountBalance, AccountType
+from app.core.auth import CurrentUser, get_current_active_user
+from app.core.balance_cache import BalanceCache, balance_etag, get_balance_cache
+from app.core.pagination import NEXT_CURSOR_HEADER, encode_account_cursor, decode_account_cursor
+
+_VALID_ACCOUNT_TYPES = frozenset(get_args(AccountType))
+
+# Account.balance is a deferred SQL aggregate; load it in the same SELECT
+_BALANCE = undefer(Account.balance)
+
+def _reload_with_balance(db: Session, account_id: int) -> Account:
+    """Re-read an account after commit, with its balance in the same SELECT."""
+    return db.get(Account, account_id, options=[_BALANCE], populate_existing=True)
 
 router = APIRouter(
     prefix="/accounts",
@@ -17,18 +30,18 @@ router = APIRouter(
 def create_account(
     account: AccountCreate, 
     db: Session = Depends(get_db), 
-    current_user: User = Depends(get_current_active_user)
+    current_user: CurrentUser = Depends(get_current_active_user)
 ):
     """
     Create a new account for the authenticated user.
     """
     # Check if account with same name already exists for this user
-    existing_account = db.query(Account).filter(
+    name_taken = db.query(exists().where(
         Account.owner_id == current_user.id,
         Account.name == account.name
-    ).first()
+    )).scalar()
     
-    if existing_account:
+    if name_taken:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Account with this name already exists"
@@ -43,47 +56,75 @@ def create_account(
     )
     
     db.add(db_account)
-    db.commit()
-    db.refresh(db_account)
+    try:
+        db.flush()
+        account_id = db_account.id
+        db.commit()
+    except IntegrityError:
+        # A concurrent request created the same name after our check
+        db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Account with this name already exists"
+        )
     
-    return db_account
+    return _reload_with_balance(db, account_id)
 
 @router.get("/", response_model=List[AccountResponse])
 def get_accounts(
+    response: Response,
     db: Session = Depends(get_db), 
-    current_user: User = Depends(get_current_active_user),
-    skip: int = 0, 
+    current_user: CurrentUser = Depends(get_current_active_user),
+    cursor: Optional[str] = Query(None),
+    skip: int = Query(0, deprecated=True),
     limit: int = 100,
     account_type: str = None
 ):
     """
-    Get all accounts for the authenticated user.
+    Get all accounts for the authenticated user, ordered by ID.
     Optional filtering by account type.
+
+    Uses keyset pagination: when more results exist, the cursor for the
+    next page is returned in the X-Next-Cursor response header.
+    `skip` is kept for backward compatibility and ignored when a cursor is given.
     """
-    query = db.query(Account).filter(Account.owner_id == current_user.id)
+    query = db.query(Account).options(_BALANCE).filter(Account.owner_id == current_user.id)
     
     if account_type:
-        valid_types = ['asset', 'liability', 'equity', 'revenue', 'expense']
-        if account_type not in valid_types:
+        if account_type not in _VALID_ACCOUNT_TYPES:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"Invalid account type. Must be one of {valid_types}"
+                detail=f"Invalid account type. Must be one of {sorted(_VALID_ACCOUNT_TYPES)}"
             )
         query = query.filter(Account.account_type == account_type)
     
-    accounts = query.offset(skip).limit(limit).all()
+    if cursor:
+        query = query.filter(Account.id > decode_account_cursor(cursor))
+    
+    query = query.order_by(Account.id)
+    if skip and not cursor:
+        query = query.offset(skip)
+    
+    # Fetch one extra row to detect whether there is a next page
+    accounts = query.limit(limit + 1).all()
+    if len(accounts) > limit:
+        accounts = accounts[:limit]
+        # An empty page (limit=0) has no last row to continue from
+        if accounts:
+            response.headers[NEXT_CURSOR_HEADER] = encode_account_cursor(accounts[-1].id)
+    
     return accounts
 
 @router.get("/{account_id}", response_model=AccountResponse)
 def get_account(
     account_id: int, 
     db: Session = Depends(get_db), 
-    current_user: User = Depends(get_current_active_user)
+    current_user: CurrentUser = Depends(get_current_active_user)
 ):
     """
     Get a specific account by ID.
     """
-    account = db.query(Account).filter(
+    account = db.query(Account).options(_BALANCE).filter(
         Account.id == account_id,
         Account.owner_id == current_user.id
     ).first()
@@ -99,36 +140,55 @@ def get_account(
 @router.get("/{account_id}/balance", response_model=AccountBalance)
 def get_account_balance(
     account_id: int, 
+    request: Request,
+    response: Response,
     db: Session = Depends(get_db), 
-    current_user: User = Depends(get_current_active_user)
+    current_user: CurrentUser = Depends(get_current_active_user),
+    balance_cache: Optional[BalanceCache] = Depends(get_balance_cache)
 ):
     """
     Get the balance of a specific account.
+    Balances carry an ETag, so clients sending If-None-Match get a 304 when
+    the balance hasn't changed. With Redis configured they are also cached
+    briefly across all workers.
     """
-    account = db.query(Account).filter(
-        Account.id == account_id,
-        Account.owner_id == current_user.id
-    ).first()
+    cached = balance_cache.get(account_id) if balance_cache is not None else None
+    if cached is None or cached["owner_id"] != current_user.id:
+        version = balance_cache.version(account_id) if balance_cache is not None else None
+        account = db.query(Account).options(_BALANCE).filter(
+            Account.id == account_id,
+            Account.owner_id == current_user.id
+        ).first()
+        
+        if account is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Account not found"
+            )
+        
+        balance = {
+            "account_id": account.id,
+            "account_name": account.name,
+            "account_type": account.account_type,
+            "balance": account.balance
+        }
+        cached = {"owner_id": account.owner_id, "balance": balance, "etag": balance_etag(balance)}
+        if version is not None:
+            balance_cache.store(account_id, cached, version)
     
-    if account is None:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Account not found"
-        )
+    if request.headers.get("if-none-match") == cached["etag"]:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": cached["etag"]})
     
-    return {
-        "account_id": account.id,
-        "account_name": account.name,
-        "account_type": account.account_type,
-        "balance": account.balance
-    }
+    response.headers["ETag"] = cached["etag"]
+    return cached["balance"]
 
 @router.put("/{account_id}", response_model=AccountResponse)
 def update_account(
     account_id: int,
     account_update: AccountCreate,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
+    current_user: CurrentUser = Depends(get_current_active_user),
+    balance_cache: Optional[BalanceCache] = Depends(get_balance_cache)
 ):
     """
     Update an existing account.
@@ -145,13 +205,13 @@ def update_account(
         )
     
     # Check if another account with the same name exists
-    existing_account = db.query(Account).filter(
+    name_taken = db.query(exists().where(
         Account.owner_id == current_user.id,
         Account.name == account_update.name,
         Account.id != account_id
-    ).first()
+    )).scalar()
     
-    if existing_account:
+    if name_taken:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Another account with this name already exists"
@@ -162,16 +222,25 @@ def update_account(
     db_account.account_type = account_update.account_type
     db_account.description = account_update.description
     
-    db.commit()
-    db.refresh(db_account)
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Another account with this name already exists"
+        )
+    if balance_cache is not None:
+        balance_cache.invalidate([account_id])
     
-    return db_account
+    return _reload_with_balance(db, account_id)
 
 @router.delete("/{account_id}", status_code=status.HTTP_204_NO_CONTENT)
 def delete_account(
     account_id: int,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
+    current_user: CurrentUser = Depends(get_current_active_user),
+    balance_cache: Optional[BalanceCache] = Depends(get_balance_cache)
 ):
     """
     Delete an account.
@@ -196,5 +265,7 @@ def delete_account(
     
     db.delete(db_account)
     db.commit()
+    if balance_cache is not None:
+        balance_cache.invalidate([account_id])
     
     return None
@@ -16,8 +16,9 @@ router = APIRouter(
     responses={401: {"description": "Unauthorized"}},
 )
 
+# Sync so the user query and bcrypt check run in the threadpool, off the event loop
 @router.post("/token")
-async def login_for_access_token(
+def login_for_access_token(
     form_data: OAuth2PasswordRequestForm = Depends(),
     db: Session = Depends(get_db)
 ):
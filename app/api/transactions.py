@@ -1,17 +1,25 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy import func, insert, select, tuple_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, selectinload
+from typing import List, Optional
 from datetime import datetime
 import logging
 
 from app.db.database import get_db
-from app.models.models import Transaction, TransactionEntry, Account, User
+from app.models.models import Transaction, TransactionEntry, Account
 from app.schemas.schemas import TransactionCreate, TransactionResponse
-from app.core.auth import get_current_active_user
+from app.core.auth import CurrentUser, get_current_active_user
 from app.core.logging import logger
+from app.core.balance_cache import BalanceCache, get_balance_cache
+from app.core.pagination import NEXT_CURSOR_HEADER, encode_transaction_cursor, decode_transaction_cursor
 
 # Configure logging
 
+# Rows fetched per round trip when streaming an export
+EXPORT_BATCH_SIZE = 200
+
 router = APIRouter(
     prefix="/transactions",
     tags=["transactions"],
@@ -22,7 +30,8 @@ router = APIRouter(
 def create_transaction(
     transaction: TransactionCreate, 
     db: Session = Depends(get_db), 
-    current_user: User = Depends(get_current_active_user)
+    current_user: CurrentUser = Depends(get_current_active_user),
+    balance_cache: Optional[BalanceCache] = Depends(get_balance_cache)
 ):
     """
     Create a new transaction with double-entry bookkeeping.
@@ -30,87 +39,102 @@ def create_transaction(
     1. All accounts exist and belong to the user
     2. Total debits equal total credits (double-entry principle)
     3. Each entry is either a debit or a credit, not both
+    Check 2 runs in TransactionCreate validation, before this handler is called,
+    and is backed by a deferred constraint trigger in the database.
     """
-    # Check if reference number already exists
-    existing_transaction = db.query(Transaction).filter(
-        Transaction.reference_number == transaction.reference_number
-    ).first()
-    
-    if existing_transaction:
-        logger.error(f"Transaction creation failed: Transaction with reference number {transaction.reference_number} already exists")
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Transaction with this reference number already exists"
-        )
+    # Validate that each entry is either debit or credit, not both,
+    # before touching the database
+    for entry in transaction.entries:
+        if entry.debit_amount > 0 and entry.credit_amount > 0:
+            logger.error("Transaction creation failed: Entry %s is both debit and credit", entry.account_id)
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="An entry cannot be both a debit and a credit"
+            )
+        
+        if entry.debit_amount == 0 and entry.credit_amount == 0:
+            logger.error("Transaction creation failed: Entry %s is neither debit nor credit", entry.account_id)
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="An entry must be either a debit or a credit"
+            )
     
     # Validate accounts exist and belong to the user
-    account_ids = [entry.account_id for entry in transaction.entries]
-    accounts = db.query(Account).filter(
+    # Count matching rows in the database rather than loading the accounts
+    account_ids = {entry.account_id for entry in transaction.entries}
+    owned_count = db.query(func.count(Account.id)).filter(
         Account.id.in_(account_ids),
         Account.owner_id == current_user.id
-    ).all()
+    ).scalar()
     
-    if len(accounts) != len(set(account_ids)):
-        logger.error(f"Transaction creation failed: One or more accounts do not exist or do not belong to user {current_user.id}")
+    if owned_count != len(account_ids):
+        logger.error(
+            "Transaction creation failed: One or more accounts do not exist or do not belong to user %s",
+            current_user.id
+        )
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="One or more accounts do not exist or do not belong to you"
         )
     
-    # Create transaction
+    # Create transaction; without a client-supplied date the column's
+    # server default stamps it with the database clock
     db_transaction = Transaction(
         reference_number=transaction.reference_number,
         description=transaction.description,
-        transaction_date=transaction.transaction_date or datetime.utcnow(),
         created_by_id=current_user.id
     )
+    if transaction.transaction_date:
+        db_transaction.transaction_date = transaction.transaction_date
     
     db.add(db_transaction)
-    db.flush()  # Get the transaction ID without committing
-    
-    # Create transaction entries
-    for entry in transaction.entries:
-        # Validate that entry is either debit or credit, not both
-        if entry.debit_amount > 0 and entry.credit_amount > 0:
-            db.rollback()
-            logger.error(f"Transaction creation failed: Entry {entry.account_id} is both debit and credit")
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="An entry cannot be both a debit and a credit"
-            )
-        
-        if entry.debit_amount == 0 and entry.credit_amount == 0:
-            db.rollback()
-            logger.error(f"Transaction creation failed: Entry {entry.account_id} is neither debit nor credit")
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="An entry must be either a debit or a credit"
-            )
-        
-        db_entry = TransactionEntry(
-            transaction_id=db_transaction.id,
-            account_id=entry.account_id,
-            debit_amount=entry.debit_amount,
-            credit_amount=entry.credit_amount,
-            description=entry.description
+    try:
+        db.flush()  # Get the transaction ID without committing
+    except IntegrityError:
+        # reference_number is UNIQUE, so a duplicate is rejected here
+        # without a separate existence query
+        db.rollback()
+        logger.error(
+            "Transaction creation failed: Transaction with reference number %s already exists",
+            transaction.reference_number
+        )
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Transaction with this reference number already exists"
         )
-        db.add(db_entry)
     
-    # Commit the transaction
     try:
+        # Create all transaction entries with a single multi-row INSERT
+        db.execute(
+            insert(TransactionEntry),
+            [
+                {
+                    "transaction_id": db_transaction.id,
+                    "account_id": entry.account_id,
+                    "debit_amount": entry.debit_amount,
+                    "credit_amount": entry.credit_amount,
+                    "description": entry.description
+                }
+                for entry in transaction.entries
+            ]
+        )
+        
+        # Commit the transaction
         db.commit()
+        if balance_cache is not None:
+            balance_cache.invalidate(account_ids)
         db.refresh(db_transaction)
         
         # Log the transaction
         logger.info(
-            f"Transaction {db_transaction.reference_number} created successfully by user {current_user.username} "
-            f"with {len(transaction.entries)} entries"
+            "Transaction %s created successfully by user %s with %d entries",
+            db_transaction.reference_number, current_user.username, len(transaction.entries)
         )
         
         return db_transaction
     except Exception as e:
         db.rollback()
-        logger.error(f"Error creating transaction: {str(e)}")
+        logger.error("Error creating transaction: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="An error occurred while creating the transaction"
@@ -118,18 +142,27 @@ def create_transaction(
 
 @router.get("/", response_model=List[TransactionResponse])
 def get_transactions(
+    response: Response,
     db: Session = Depends(get_db), 
-    current_user: User = Depends(get_current_active_user),
-    skip: int = 0, 
+    current_user: CurrentUser = Depends(get_current_active_user),
+    cursor: Optional[str] = Query(None),
+    skip: int = Query(0, deprecated=True),
     limit: int = 100,
     start_date: datetime = None,
     end_date: datetime = None
 ):
     """
-    Get all transactions created by the authenticated user.
+    Get all transactions created by the authenticated user, newest first.
     Optional filtering by date range.
+
+    Uses keyset pagination on (transaction_date, id): when more results exist,
+    the cursor for the next page is returned in the X-Next-Cursor response header.
+    `skip` is kept for backward compatibility and ignored when a cursor is given.
     """
-    query = db.query(Transaction).filter(Transaction.created_by_id == current_user.id)
+    # Load all entries for the page in one IN query instead of one per transaction
+    query = db.query(Transaction).options(
+        selectinload(Transaction.entries)
+    ).filter(Transaction.created_by_id == current_user.id)
     
     if start_date:
         query = query.filter(Transaction.transaction_date >= start_date)
@@ -137,25 +170,83 @@ def get_transactions(
     if end_date:
         query = query.filter(Transaction.transaction_date <= end_date)
     
-    transactions = query.order_by(Transaction.transaction_date.desc()).offset(skip).limit(limit).all()
+    if cursor:
+        cursor_date, cursor_id = decode_transaction_cursor(cursor)
+        query = query.filter(
+            tuple_(Transaction.transaction_date, Transaction.id) < tuple_(cursor_date, cursor_id)
+        )
+    
+    query = query.order_by(Transaction.transaction_date.desc(), Transaction.id.desc())
+    if skip and not cursor:
+        query = query.offset(skip)
+    
+    # Fetch one extra row to detect whether there is a next page
+    transactions = query.limit(limit + 1).all()
+    if len(transactions) > limit:
+        transactions = transactions[:limit]
+        # An empty page (limit=0) has no last row to continue from
+        if transactions:
+            last = transactions[-1]
+            response.headers[NEXT_CURSOR_HEADER] = encode_transaction_cursor(last.transaction_date, last.id)
+    
     return transactions
 
+@router.get("/export")
+def export_transactions(
+    db: Session = Depends(get_db),
+    current_user: CurrentUser = Depends(get_current_active_user),
+    start_date: datetime = None,
+    end_date: datetime = None
+):
+    """
+    Stream every transaction created by the authenticated user, newest first,
+    as newline-delimited JSON. Optional filtering by date range.
+
+    Rows are fetched in batches of EXPORT_BATCH_SIZE, so memory use stays flat
+    however many transactions are exported.
+    """
+    query = select(Transaction).options(
+        selectinload(Transaction.entries)
+    ).where(Transaction.created_by_id == current_user.id)
+    
+    if start_date:
+        query = query.where(Transaction.transaction_date >= start_date)
+    
+    if end_date:
+        query = query.where(Transaction.transaction_date <= end_date)
+    
+    query = query.order_by(
+        Transaction.transaction_date.desc(), Transaction.id.desc()
+    ).execution_options(yield_per=EXPORT_BATCH_SIZE)
+    
+    def stream():
+        # The session has to outlive the request dependency, so close it here
+        try:
+            for transaction in db.scalars(query):
+                yield TransactionResponse.model_validate(transaction).model_dump_json() + "\n"
+        finally:
+            db.close()
+    
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
 @router.get("/{transaction_id}", response_model=TransactionResponse)
 def get_transaction(
     transaction_id: int, 
     db: Session = Depends(get_db), 
-    current_user: User = Depends(get_current_active_user)
+    current_user: CurrentUser = Depends(get_current_active_user)
 ):
     """
     Get a specific transaction by ID.
     """
-    transaction = db.query(Transaction).filter(
+    transaction = db.query(Transaction).options(
+        selectinload(Transaction.entries)
+    ).filter(
         Transaction.id == transaction_id,
         Transaction.created_by_id == current_user.id
     ).first()
     
     if transaction is None:
-        logger.error(f"Transaction retrieval failed: Transaction {transaction_id} not found")
+        logger.error("Transaction retrieval failed: Transaction %s not found", transaction_id)
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Transaction not found"
@@ -167,7 +258,8 @@ def get_transaction(
 def delete_transaction(
     transaction_id: int,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
+    current_user: CurrentUser = Depends(get_current_active_user),
+    balance_cache: Optional[BalanceCache] = Depends(get_balance_cache)
 ):
     """
     Delete a transaction and its entries.
@@ -178,16 +270,19 @@ def delete_transaction(
     ).first()
     
     if transaction is None:
-        logger.error(f"Transaction deletion failed: Transaction {transaction_id} not found")
+        logger.error("Transaction deletion failed: Transaction %s not found", transaction_id)
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Transaction not found"
         )
     
     # Delete the transaction (cascade will delete entries)
+    account_ids = {entry.account_id for entry in transaction.entries}
     db.delete(transaction)
     db.commit()
+    if balance_cache is not None:
+        balance_cache.invalidate(account_ids)
     
-    logger.info(f"Transaction {transaction_id} deleted successfully by user {current_user.username}")
+    logger.info("Transaction %s deleted successfully by user %s", transaction_id, current_user.username)
     
     return None
@@ -1,11 +1,13 @@
 from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy import or_
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 from typing import List
 
 from app.db.database import get_db
 from app.models.models import User
 from app.schemas.schemas import UserCreate, UserResponse
-from app.core.auth import get_password_hash, get_current_active_user
+from app.core.auth import CurrentUser, get_password_hash, get_current_active_user
 
 router = APIRouter(
     prefix="/users",
@@ -18,20 +20,20 @@ def create_user(user: UserCreate, db: Session = Depends(get_db)):
     """
     Create a new user.
     """
-    # Check if username already exists
-    db_user = db.query(User).filter(User.username == user.username).first()
-    if db_user:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Username already registered"
-        )
+    # Check for an existing username or email in a single query.
+    # Rows matching the username sort first so that error takes precedence.
+    existing_user = db.query(User.username, User.email).filter(
+        or_(User.username == user.username, User.email == user.email)
+    ).order_by((User.username == user.username).desc()).first()
     
-    # Check if email already exists
-    db_user = db.query(User).filter(User.email == user.email).first()
-    if db_user:
+    if existing_user:
+        if existing_user.username == user.username:
+            detail = "Username already registered"
+        else:
+            detail = "Email already registered"
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Email already registered"
+            detail=detail
         )
     
     # Create new user
@@ -43,20 +45,28 @@ def create_user(user: UserCreate, db: Session = Depends(get_db)):
     )
     
     db.add(db_user)
-    db.commit()
+    try:
+        db.commit()
+    except IntegrityError:
+        # A concurrent signup claimed the username or email after our check
+        db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Username or email already registered"
+        )
     db.refresh(db_user)
     
     return db_user
 
 @router.get("/me", response_model=UserResponse)
-def get_current_user_info(current_user: User = Depends(get_current_active_user)):
+def get_current_user_info(current_user: CurrentUser = Depends(get_current_active_user)):
     """
     Get information about the currently authenticated user.
     """
     return current_user
 
 @router.get("/{user_id}", response_model=UserResponse)
-def get_user(user_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_active_user)):
+def get_user(user_id: int, db: Session = Depends(get_db), current_user: CurrentUser = Depends(get_current_active_user)):
     """
     Get a specific user by ID.
     Only the user themselves can access their own information.
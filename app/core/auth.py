@@ -1,5 +1,8 @@
-from datetime import datetime, timedelta
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from threading import Lock
 from typing import Optional
+from cachetools import TTLCache
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
@@ -8,7 +11,7 @@ from sqlalchemy.orm import Session
 
 from app.db.database import get_db
 from app.models.models import User
-from app.core.config import SECRET_KEY, ALGORITHM, ACCESS_TOKEN_EXPIRE_MINUTES
+from app.core.config import SECRET_KEY, ALGORITHM, ACCESS_TOKEN_EXPIRE_MINUTES, USER_CACHE_TTL_SECONDS
 
 # Password hashing
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
@@ -16,6 +19,21 @@ pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 # OAuth2 scheme for token authentication
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
+@dataclass(frozen=True)
+class CurrentUser:
+    """Detached snapshot of the authenticated user's fields."""
+    id: int
+    username: str
+    email: str
+    is_active: bool
+    created_at: datetime
+
+# Short-lived cache of authenticated users, keyed by username, per worker.
+# Nothing invalidates it: a user changed in the database (e.g. deactivated)
+# is seen by each worker within USER_CACHE_TTL_SECONDS.
+_user_cache = TTLCache(maxsize=10_000, ttl=USER_CACHE_TTL_SECONDS)
+_user_cache_lock = Lock()
+
 def verify_password(plain_password, hashed_password):
     """Verify a password against a hash."""
     return pwd_context.verify(plain_password, hashed_password)
@@ -36,16 +54,20 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
 
     if expires_delta:
-        expire = datetime.utcnow() + expires_delta
+        expire = datetime.now(timezone.utc) + expires_delta
     else:
-        expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+        expire = datetime.now(timezone.utc) + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
 
     to_encode.update({"exp": expire})
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
-    """Get the current authenticated user from the JWT token."""
+def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+    """
+    Get the current authenticated user from the JWT token.
+    A plain def so FastAPI runs the blocking user lookup in the threadpool
+    rather than on the event loop.
+    """
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -60,13 +82,32 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = De
     except JWTError:
         raise credentials_exception
 
-    user = db.query(User).filter(User.username == username).first()
+    with _user_cache_lock:
+        cached_user = _user_cache.get(username)
+    if cached_user is not None:
+        return cached_user
+
+    # Select only the cached fields; the statement is compiled once per engine
+    # and reused from SQLAlchemy's compiled cache on later cache misses
+    user = db.query(
+        User.id, User.username, User.email, User.is_active, User.created_at
+    ).filter(User.username == username).first()
     if user is None:
         raise credentials_exception
 
-    return user
+    current_user = CurrentUser(
+        id=user.id,
+        username=user.username,
+        email=user.email,
+        is_active=user.is_active,
+        created_at=user.created_at
+    )
+    with _user_cache_lock:
+        _user_cache[username] = current_user
+
+    return current_user
 
-async def get_current_active_user(current_user: User = Depends(get_current_user)):
+async def get_current_active_user(current_user: CurrentUser = Depends(get_current_user)):
     """Get the current active user."""
     if not current_user.is_active:
         raise HTTPException(status_code=400, detail="Inactive user")
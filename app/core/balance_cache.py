@@ -0,0 +1,122 @@
+"""
+Redis cache of account balances served by GET /accounts/{id}/balance.
+
+The cache is shared by every worker and replica, so a write through any of
+them invalidates it for all. It is off unless REDIS_URL is set; without it
+every balance is read from the database.
+
+Entries live for BALANCE_CACHE_TTL_SECONDS and are dropped whenever a write
+touches the account. Each account also has a write counter: a reader records
+it before querying and only stores its result if no write happened meanwhile,
+so a balance computed from a pre-commit snapshot is never cached.
+"""
+import hashlib
+import logging
+from functools import lru_cache
+from typing import Iterable, Optional
+
+import orjson
+
+from app.core.config import REDIS_URL, BALANCE_CACHE_TTL_SECONDS
+
+logger = logging.getLogger(__name__)
+
+def balance_etag(balance: dict) -> str:
+    """Weak ETag for a balance payload, derived from its content."""
+    return 'W/"%s"' % hashlib.sha1(repr(sorted(balance.items())).encode("utf-8")).hexdigest()
+
+class BalanceCache:
+    """
+    Balance entries and write counters stored in Redis.
+    Redis errors are logged and treated as cache misses, so an unavailable
+    cache degrades to reading from the database.
+    """
+
+    def __init__(self, client, ttl: int = BALANCE_CACHE_TTL_SECONDS):
+        # Imported here so deployments without Redis don't need the package
+        from redis.exceptions import RedisError, WatchError
+
+        self.client = client
+        self.ttl = ttl
+        self._errors = RedisError
+        self._watch_error = WatchError
+
+    @staticmethod
+    def _entry_key(account_id: int) -> str:
+        return f"acct:{account_id}:bal"
+
+    @staticmethod
+    def _version_key(account_id: int) -> str:
+        return f"acct:{account_id}:ver"
+
+    def version(self, account_id: int) -> Optional[int]:
+        """Return the account's write counter, to pass to store; None if unavailable."""
+        try:
+            return int(self.client.get(self._version_key(account_id)) or 0)
+        except self._errors as e:
+            logger.warning(f"Balance cache unavailable: {str(e)}")
+            return None
+
+    def get(self, account_id: int) -> Optional[dict]:
+        """Return the cached {"owner_id", "balance", "etag"} entry, if any."""
+        try:
+            cached = self.client.get(self._entry_key(account_id))
+        except self._errors as e:
+            logger.warning(f"Balance cache unavailable: {str(e)}")
+            return None
+        return orjson.loads(cached) if cached is not None else None
+
+    def store(self, account_id: int, entry: dict, version: int):
+        """
+        Cache an entry computed while the write counter was `version`.
+        Nothing is stored if the counter has moved on, including while this runs.
+        """
+        version_key = self._version_key(account_id)
+        try:
+            with self.client.pipeline() as pipe:
+                pipe.watch(version_key)
+                if int(pipe.get(version_key) or 0) != version:
+                    return
+                pipe.multi()
+                # Decimals are stored as strings; the response model parses them back
+                pipe.set(self._entry_key(account_id), orjson.dumps(entry, default=str), ex=self.ttl)
+                pipe.execute()
+        except self._watch_error:
+            # A write bumped the counter after we checked it
+            pass
+        except self._errors as e:
+            logger.warning(f"Balance cache unavailable: {str(e)}")
+
+    def invalidate(self, account_ids: Iterable[int]):
+        """Drop cached balances after a committed write to the given accounts."""
+        account_ids = list(account_ids)
+        if not account_ids:
+            return
+        try:
+            with self.client.pipeline() as pipe:
+                for account_id in account_ids:
+                    pipe.incr(self._version_key(account_id))
+                    pipe.delete(self._entry_key(account_id))
+                pipe.execute()
+        except self._errors as e:
+            # Entries for these accounts may be served until they expire
+            logger.error(f"Failed to invalidate cached balances for accounts {account_ids}: {str(e)}")
+
+@lru_cache(maxsize=1)
+def get_balance_cache() -> Optional[BalanceCache]:
+    """
+    Dependency returning the shared balance cache, or None when REDIS_URL
+    is not set. Created on first use.
+    """
+    if not REDIS_URL:
+        return None
+
+    try:
+        from redis import Redis
+    except ImportError:
+        logger.error("REDIS_URL is set but the redis package is not installed; balance caching is disabled")
+        return None
+
+    # Short timeouts: a slow cache must not hold up balance reads
+    client = Redis.from_url(REDIS_URL, socket_connect_timeout=1, socket_timeout=1)
+    return BalanceCache(client)
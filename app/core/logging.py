@@ -1,11 +1,29 @@
+import atexit
 import logging
+import queue
 import sys
+from logging.handlers import QueueHandler, QueueListener
 from pathlib import Path
 
 # Create logs directory if it doesn't exist
 log_dir = Path("logs")
 log_dir.mkdir(exist_ok=True)
 
+def queue_handler(*handlers):
+    """
+    Return a QueueHandler feeding `handlers` from a background listener thread,
+    so threads that log never block on file or console I/O.
+    The target handlers do the formatting; the QueueHandler only renders the
+    message (and any traceback) so records can cross threads.
+    """
+    log_queue = queue.SimpleQueue()
+    listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    handler = QueueHandler(log_queue)
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    return handler
+
 # Configure logging
 def setup_logger():
     logger = logging.getLogger("accounting")
@@ -34,10 +52,8 @@ def setup_logger():
     console_handler.setLevel(logging.INFO)
     console_handler.setFormatter(console_formatter)
     
-    # Add handlers to logger
-    logger.addHandler(file_handler)
-    logger.addHandler(error_handler)
-    logger.addHandler(console_handler)
+    # Add handlers to logger, written from a background thread
+    logger.addHandler(queue_handler(file_handler, error_handler, console_handler))
     
     return logger
 
@@ -0,0 +1,31 @@
+"""
+Pure ASGI middleware.
+
+These wrap the ASGI callable directly instead of subclassing Starlette's
+BaseHTTPMiddleware, so responses stream through untouched rather than being
+relayed via an extra task and memory channel per request.
+"""
+import time
+
+class RequestTimingMiddleware:
+    """Add an X-Process-Time header (seconds) to every HTTP response."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                elapsed = time.perf_counter() - start
+                headers = list(message.get("headers", []))
+                headers.append((b"x-process-time", f"{elapsed:.4f}".encode("latin-1")))
+                message["headers"] = headers
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
@@ -0,0 +1,58 @@
+"""
+Cursor helpers for keyset pagination on list endpoints.
+
+A cursor is an opaque base64url string encoding the sort key of the last
+row on the previous page, so the next page can be fetched with an index
+seek instead of an OFFSET scan.
+"""
+import base64
+import binascii
+from datetime import datetime
+from typing import Tuple
+
+from fastapi import HTTPException, status
+
+# Response header carrying the cursor for the next page
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+def _encode(raw: str) -> str:
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+def _decode(cursor: str) -> str:
+    padded = cursor + "=" * (-len(cursor) % 4)
+    try:
+        return base64.urlsafe_b64decode(padded.encode("ascii")).decode("utf-8")
+    except (binascii.Error, ValueError, UnicodeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+
+def encode_transaction_cursor(transaction_date: datetime, transaction_id: int) -> str:
+    """Encode the (transaction_date, id) sort key of a transaction."""
+    return _encode(f"{transaction_date.isoformat()}|{transaction_id}")
+
+def decode_transaction_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Decode a cursor produced by encode_transaction_cursor."""
+    try:
+        iso_date, transaction_id = _decode(cursor).split("|")
+        return datetime.fromisoformat(iso_date), int(transaction_id)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+
+def encode_account_cursor(account_id: int) -> str:
+    """Encode the id sort key of an account."""
+    return _encode(str(account_id))
+
+def decode_account_cursor(cursor: str) -> int:
+    """Decode a cursor produced by encode_account_cursor."""
+    try:
+        return int(_decode(cursor))
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
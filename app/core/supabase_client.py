@@ -1,4 +1,4 @@
-from supabase import create_client
+from functools import lru_cache
 import os
 import logging
 
@@ -7,6 +7,8 @@ logger = logging.getLogger(__name__)
 # Supabase configuration
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY")
+# Seconds a PostgREST request may take (the client library defaults to 120)
+SUPABASE_TIMEOUT_SECONDS = float(os.getenv("SUPABASE_TIMEOUT_SECONDS", "30"))
 
 if not SUPABASE_URL or not SUPABASE_KEY:
     logger.warning("SUPABASE_URL or SUPABASE_KEY environment variables are not set. Supabase functionality will not work.")
@@ -20,11 +22,28 @@ def get_supabase_client():
         return None
         
     try:
+        # Imported here so processes that never touch Supabase skip loading it
+        from supabase import create_client
+        from supabase.lib.client_options import ClientOptions
+        
         logger.info("Initializing Supabase client")
-        return create_client(SUPABASE_URL, SUPABASE_KEY)
+        client = create_client(
+            SUPABASE_URL,
+            SUPABASE_KEY,
+            options=ClientOptions(postgrest_client_timeout=SUPABASE_TIMEOUT_SECONDS)
+        )
+        # Build the PostgREST client, and with it the keep-alive httpx
+        # connection pool every repository query shares, up front rather
+        # than inside the first request
+        client.postgrest
+        return client
     except Exception as e:
         logger.error(f"Error initializing Supabase client: {str(e)}")
         raise
 
-# Initialize the Supabase client
-supabase = get_supabase_client()
+@lru_cache(maxsize=1)
+def get_supabase():
+    """
+    Return the shared Supabase client, creating it on first use.
+    """
+    return get_supabase_client()
@@ -7,8 +7,8 @@ import time
 import os
 from contextlib import contextmanager
 
-from app.core.config import DATABASE_URL
-from app.core.supabase_client import supabase
+from app.core.config import DATABASE_URL, DB_POOL_SIZE, DB_MAX_OVERFLOW
+from app.core.supabase_client import get_supabase
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -20,6 +20,25 @@ Base = declarative_base()
 if DATABASE_URL.startswith("postgres://"):
     DATABASE_URL = DATABASE_URL.replace("postgres://", "postgresql://", 1)
 
+def _create_engine():
+    """
+    Create the SQLAlchemy engine with connection pooling.
+    Pool size is tunable via DB_POOL_SIZE / DB_MAX_OVERFLOW; every sync route
+    holds a connection while it runs, so this caps request concurrency.
+    """
+    return create_engine(
+        DATABASE_URL,
+        poolclass=QueuePool,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=30,
+        pool_recycle=1800,
+        pool_pre_ping=True,  # Transparently replace connections dropped by the server
+        pool_use_lifo=True,  # Reuse hot connections so idle ones can be recycled under bursty load
+        query_cache_size=1200,  # Room for every hot statement's compiled SQL (default 500)
+        connect_args={"connect_timeout": 10},  # Add connection timeout
+    )
+
 # Add retry logic for database connection
 def get_engine(retries=5, delay=2):
     """
@@ -30,15 +49,7 @@ def get_engine(retries=5, delay=2):
         try:
             logger.info(f"Attempting to connect to database (attempt {attempt+1}/{retries})")
             # Create SQLAlchemy engine with connection pooling
-            engine = create_engine(
-                DATABASE_URL,
-                poolclass=QueuePool,
-                pool_size=5,
-                max_overflow=10,
-                pool_timeout=30,
-                pool_recycle=1800,
-                connect_args={"connect_timeout": 10},  # Add connection timeout
-            )
+            engine = _create_engine()
 
             # Test the connection
             with engine.connect() as conn:
@@ -56,15 +67,7 @@ def get_engine(retries=5, delay=2):
                 # This allows the application to start and retry connections later
                 if os.getenv("RAILWAY_ENVIRONMENT_NAME") == "production":
                     logger.warning("Creating engine anyway since we're in production")
-                    return create_engine(
-                        DATABASE_URL,
-                        poolclass=QueuePool,
-                        pool_size=5,
-                        max_overflow=10,
-                        pool_timeout=30,
-                        pool_recycle=1800,
-                        connect_args={"connect_timeout": 10},
-                    )
+                    return _create_engine()
                 raise
 
 # Get the engine with retry logic (for SQLAlchemy compatibility)
@@ -91,7 +94,7 @@ def get_table(table_name):
     """
     Get a Supabase table reference.
     """
-    return supabase.table(table_name)
+    return get_supabase().table(table_name)
 
 @contextmanager
 def supabase_transaction():
@@ -100,7 +103,7 @@ def supabase_transaction():
     This is a simple implementation as Supabase doesn't have built-in transaction support.
     """
     try:
-        yield supabase
+        yield get_supabase()
     except Exception as e:
         logger.error(f"Error in Supabase transaction: {str(e)}")
         raise
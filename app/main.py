@@ -1,29 +1,47 @@
 from fastapi import FastAPI, Request, Depends, HTTPException
-from fastapi.responses import HTMLResponse, JSONResponse
+from fastapi.responses import HTMLResponse, ORJSONResponse, Response
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from fastapi.middleware.cors import CORSMiddleware
 from sqlalchemy import text, exc
+from sqlalchemy.exc import SQLAlchemyError
+from anyio import to_thread
+import asyncio
 import os
 import logging
 import time
 from pathlib import Path
 
-from app.db.database import engine, Base, get_db
-from app.core.supabase_client import supabase, SUPABASE_URL
-from app.core.config import PROJECT_NAME, VERSION, ALLOWED_ORIGINS, DEBUG
+from app.db.database import engine, Base, SessionLocal
+from app.core.auth import get_password_hash
+from app.models.models import User
+from app.api import users, accounts, transactions, auth
+from app.core.supabase_client import get_supabase, SUPABASE_URL
+from app.core.middleware import RequestTimingMiddleware
+from app.core.logging import queue_handler
+from app.core.config import PROJECT_NAME, VERSION, ALLOWED_ORIGINS, RAILWAY_PUBLIC_DOMAIN, DEBUG, THREADPOOL_SIZE, AUTO_CREATE_SCHEMA, DB_POOL_WARMUP, STATIC_URL
 
-# Configure logging
+# Configure logging; records are written by a background listener thread
+log_formatter = logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+stream_handler = logging.StreamHandler()
+stream_handler.setFormatter(log_formatter)
+app_log_handler = logging.FileHandler("app.log")
+app_log_handler.setFormatter(log_formatter)
 logging.basicConfig(
     level=logging.INFO,
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-    handlers=[
-        logging.StreamHandler(),
-        logging.FileHandler("app.log")
-    ]
+    handlers=[queue_handler(stream_handler, app_log_handler)]
 )
 logger = logging.getLogger(__name__)
 
+# Resolve bundled assets relative to this file so the app works from any CWD
+BASE_DIR = Path(__file__).resolve().parent
+STATIC_DIR = BASE_DIR / "static"
+TEMPLATES_DIR = BASE_DIR / "templates"
+# The asset directories ship with the app and don't change at runtime, so
+# probe them once instead of on every health check
+STATIC_OK = STATIC_DIR.is_dir()
+TEMPLATES_OK = TEMPLATES_DIR.is_dir()
+
 # Create tables with retry logic
 def create_tables():
     max_retries = 5
@@ -43,38 +61,77 @@ def create_tables():
             else:
                 logger.warning("Could not create tables, but continuing startup")
 
+def create_admin_user():
+    """
+    Create a default admin user if no users exist.
+    Blocking (database queries and bcrypt), so startup_event runs it in the threadpool.
+    """
+    db = SessionLocal()
+    try:
+        # Stops at the first row instead of counting the whole table
+        if db.query(User.id).first() is None:
+            admin_user = User(
+                username="admin",
+                email="admin@example.com",
+                password_hash=get_password_hash("admin"),
+                is_active=True
+            )
+            db.add(admin_user)
+            db.commit()
+            logger.info("Created default admin user")
+    finally:
+        db.close()
+
+async def warm_connection_pool(n: int = DB_POOL_WARMUP):
+    """
+    Open n pooled database connections concurrently and return them to the
+    pool, so the first burst of requests doesn't pay the connection handshake.
+    """
+    results = await asyncio.gather(
+        *(to_thread.run_sync(engine.connect) for _ in range(n)),
+        return_exceptions=True
+    )
+    errors = [result for result in results if isinstance(result, Exception)]
+    for result in results:
+        if not isinstance(result, Exception):
+            result.close()
+    if errors:
+        logger.warning(f"Could not warm {len(errors)}/{n} database connections: {str(errors[0])}")
+    else:
+        logger.info(f"Warmed {n} database connections")
+
 # Initialize FastAPI app
-app = FastAPI(title=PROJECT_NAME, version=VERSION)
+# Render responses with orjson, which encodes datetimes natively and faster than json.dumps
+app = FastAPI(title=PROJECT_NAME, version=VERSION, default_response_class=ORJSONResponse)
 
 # Get Railway environment variables
-RAILWAY_PUBLIC_DOMAIN = os.getenv("RAILWAY_PUBLIC_DOMAIN", "")
 RAILWAY_SERVICE_NAME = os.getenv("RAILWAY_SERVICE_NAME", "")
 RAILWAY_ENVIRONMENT_NAME = os.getenv("RAILWAY_ENVIRONMENT_NAME", "")
 RAILWAY_PROJECT_NAME = os.getenv("RAILWAY_PROJECT_NAME", "")
 
-# Configure CORS
-allowed_origins = ALLOWED_ORIGINS.copy()
-if RAILWAY_PUBLIC_DOMAIN:
-    allowed_origins.append(f"https://{RAILWAY_PUBLIC_DOMAIN}")
-    # Also add with www subdomain
-    allowed_origins.append(f"https://www.{RAILWAY_PUBLIC_DOMAIN}")
-
-# Add specific Railway domain
-allowed_origins.append("https://accounting-backend-production-4381.up.railway.app")
+# Pure ASGI middleware; added first so CORS stays the outermost layer
+app.add_middleware(RequestTimingMiddleware)
 
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=allowed_origins,
+    allow_origins=ALLOWED_ORIGINS,
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
 )
 
-# Mount static files
-app.mount("/static", StaticFiles(directory="app/static"), name="static")
+def serve_static_files(app: FastAPI, debug: bool = DEBUG, static_url: str = STATIC_URL):
+    """
+    Mount static files, unless they are served from elsewhere (STATIC_URL);
+    always mounted in debug so local development works without a web server.
+    """
+    if debug or static_url == "/static":
+        app.mount("/static", StaticFiles(directory=STATIC_DIR), name="static")
+
+serve_static_files(app)
 
 # Set up Jinja2 templates
-templates = Jinja2Templates(directory="app/templates")
+templates = Jinja2Templates(directory=TEMPLATES_DIR)
 
 # Simple HTML content for fallback
 html_content = """
@@ -91,25 +148,65 @@ html_content = """
 </html>
 """
 
-# Create tables on startup
-try:
-    create_tables()
-except Exception as e:
-    logger.error(f"Error during startup: {str(e)}")
+def render_index(static_url: str = STATIC_URL) -> bytes:
+    """Render index.html, falling back to a plain page if the template fails."""
+    try:
+        return templates.get_template("index.html").render(static_url=static_url).encode("utf-8")
+    except Exception as e:
+        logger.error(f"Error rendering template: {str(e)}")
+        return html_content.encode("utf-8")
+
+# index.html uses no per-request context, so render it once at import time
+# rather than running the Jinja2 pipeline on every hit
+index_html = render_index()
 
 @app.get("/", response_class=HTMLResponse)
-def read_root(request: Request):
+def read_root():
+    return HTMLResponse(content=index_html)
+
+# Seconds a health check result is reused, so frequent probes from monitors
+# and replicas don't each hit the database and Supabase
+HEALTH_CACHE_TTL_SECONDS = 5.0
+_health_cache = {"checked_at": 0.0, "body": None, "status_code": 200}
+
+def _probe_database():
+    """Check the database connection with SELECT 1."""
     try:
-        return templates.TemplateResponse("index.html", {"request": request})
+        # Use SQLAlchemy to check database connection
+        with engine.connect() as conn:
+            result = conn.execute(text("SELECT 1"))
+            result.fetchone()
+        return "connected"
     except Exception as e:
-        logger.error(f"Error rendering template: {str(e)}")
-        return HTMLResponse(content=html_content)
+        logger.error(f"Database health check failed: {str(e)}")
+        return "disconnected"
+
+def _probe_supabase():
+    """Check that the Supabase API is reachable."""
+    try:
+        # Simple check to see if we can access Supabase
+        get_supabase().table("_dummy_check").select("*").limit(1).execute()
+        return "connected"
+    except Exception as e:
+        logger.error(f"Supabase health check failed: {str(e)}")
+        return "disconnected"
 
 @app.get("/health")
-def health_check():
+async def health_check():
     """
-    Health check endpoint that checks database and Supabase connections
+    Health check endpoint that checks database and Supabase connections.
+    Both probes run concurrently in the threadpool, so a check takes as long
+    as the slower one. Results are cached for HEALTH_CACHE_TTL_SECONDS.
     """
+    now = time.monotonic()
+    if _health_cache["body"] is not None and now - _health_cache["checked_at"] < HEALTH_CACHE_TTL_SECONDS:
+        # Reuse the already-encoded JSON body
+        return Response(
+            content=_health_cache["body"],
+            status_code=_health_cache["status_code"],
+            media_type="application/json"
+        )
+
     health_status = {
         "status": "ok",
         "database": "unknown",
@@ -118,7 +215,7 @@ def health_check():
         "templates": "unknown",
         "environment": {
             "debug": DEBUG,
-            "allowed_origins": allowed_origins,
+            "allowed_origins": ALLOWED_ORIGINS,
             "railway_info": {
                 "public_domain": RAILWAY_PUBLIC_DOMAIN,
                 "service_name": RAILWAY_SERVICE_NAME,
@@ -128,31 +225,16 @@ def health_check():
         }
     }
 
-    # Check database connection
-    try:
-        # Use SQLAlchemy to check database connection
-        with engine.connect() as conn:
-            result = conn.execute(text("SELECT 1"))
-            result.fetchone()
-        health_status["database"] = "connected"
-    except Exception as e:
-        logger.error(f"Database health check failed: {str(e)}")
-        health_status["database"] = "disconnected"
-        health_status["status"] = "degraded"
-
-    # Check Supabase connection
-    try:
-        # Simple check to see if we can access Supabase
-        response = supabase.table("_dummy_check").select("*").limit(1).execute()
-        health_status["supabase"] = "connected"
-    except Exception as e:
-        logger.error(f"Supabase health check failed: {str(e)}")
-        health_status["supabase"] = "disconnected"
+    # Check database and Supabase connections
+    health_status["database"], health_status["supabase"] = await asyncio.gather(
+        to_thread.run_sync(_probe_database),
+        to_thread.run_sync(_probe_supabase)
+    )
+    if "disconnected" in (health_status["database"], health_status["supabase"]):
         health_status["status"] = "degraded"
 
     # Check if static files directory exists
-    static_dir = Path("app/static")
-    if static_dir.exists() and static_dir.is_dir():
+    if STATIC_OK:
         health_status["static_files"] = "available"
     else:
         logger.error("Static files directory not found")
@@ -160,8 +242,7 @@ def health_check():
         health_status["status"] = "degraded"
 
     # Check if templates directory exists
-    templates_dir = Path("app/templates")
-    if templates_dir.exists() and templates_dir.is_dir():
+    if TEMPLATES_OK:
         health_status["templates"] = "available"
     else:
         logger.error("Templates directory not found")
@@ -170,11 +251,13 @@ def health_check():
 
     # Return appropriate status code
     status_code = 200 if health_status["status"] == "ok" else 503
-
-    return JSONResponse(
+    response = ORJSONResponse(
         content=health_status,
         status_code=status_code
     )
+    _health_cache.update(checked_at=now, body=response.body, status_code=status_code)
+
+    return response
 
 @app.get("/info")
 def get_info():
@@ -195,18 +278,16 @@ def get_info():
     }
 
 # Include routers
-from app.api import users, accounts, transactions, auth
 app.include_router(auth.router)
 app.include_router(users.router)
 app.include_router(accounts.router)
 app.include_router(transactions.router)
 
 # Error handler for database exceptions
-from sqlalchemy.exc import SQLAlchemyError
 @app.exception_handler(SQLAlchemyError)
 async def sqlalchemy_exception_handler(request: Request, exc: SQLAlchemyError):
     logger.error(f"Database error: {str(exc)}")
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=503,
         content={"detail": "Database service unavailable. Please try again later."}
     )
@@ -215,8 +296,9 @@ async def sqlalchemy_exception_handler(request: Request, exc: SQLAlchemyError):
 @app.on_event("startup")
 async def startup_event():
     """
-    Create a default admin user if no users exist.
-    This is for testing purposes only and should be removed in production.
+    Warm the connection pool. When AUTO_CREATE_SCHEMA is set (local
+    development), also create the tables and a default admin user if no
+    users exist; deployments run scripts/init_db.py instead.
     """
     try:
         logger.info("Starting application...")
@@ -224,24 +306,29 @@ async def startup_event():
         logger.info(f"Railway service: {RAILWAY_SERVICE_NAME}")
         logger.info(f"Railway public domain: {RAILWAY_PUBLIC_DOMAIN}")
 
+        # Sync route handlers run in anyio's threadpool; raise its limit so the
+        # threadpool, rather than the database pool, isn't the concurrency cap
+        to_thread.current_default_thread_limiter().total_tokens = THREADPOOL_SIZE
+        logger.info(f"Threadpool size: {THREADPOOL_SIZE}")
+
+        if DB_POOL_WARMUP > 0:
+            await warm_connection_pool()
+
+        if not AUTO_CREATE_SCHEMA:
+            return
+
+        # Importing the app never touches the schema; create it here, off the
+        # event loop, only when asked to
+        try:
+            await to_thread.run_sync(create_tables)
+        except Exception as e:
+            logger.error(f"Error creating tables: {str(e)}")
+
         # Try to create the admin user, but don't fail if it doesn't work
         try:
-            db = next(get_db())
-            if db.query(User).count() == 0:
-                from app.core.auth import get_password_hash
-                admin_user = User(
-                    username="admin",
-                    email="admin@example.com",
-                    password_hash=get_password_hash("admin"),
-                    is_active=True
-                )
-                db.add(admin_user)
-                db.commit()
-                logger.info("Created default admin user")
+            await to_thread.run_sync(create_admin_user)
         except Exception as e:
             logger.error(f"Could not create admin user: {str(e)}")
             logger.info("Will try to create admin user later when database is available")
     except Exception as e:
         logger.error(f"Error during startup: {str(e)}")
-
-from app.models.models import User
@@ -1,30 +1,43 @@
-from sqlalchemy import Column, Integer, String, Float, ForeignKey, DateTime, Boolean, Index, CheckConstraint, UniqueConstraint
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, String, Numeric, ForeignKey, DateTime, Boolean, Index, CheckConstraint, UniqueConstraint, case, select
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import relationship, column_property
 from sqlalchemy.sql import func
-from datetime import datetime
+from sqlalchemy.sql.expression import FunctionElement
 from app.db.database import Base
 
+class utcnow(FunctionElement):
+    """
+    The database's current time in UTC, for naive DateTime columns.
+    CURRENT_TIMESTAMP alone follows the session's TimeZone on PostgreSQL.
+    """
+    type = DateTime()
+    inherit_cache = True
+
+@compiles(utcnow)
+def _default_utcnow(element, compiler, **kw):
+    # SQLite's CURRENT_TIMESTAMP is already UTC
+    return "CURRENT_TIMESTAMP"
+
+@compiles(utcnow, "postgresql")
+def _pg_utcnow(element, compiler, **kw):
+    return "timezone('utc', CURRENT_TIMESTAMP)"
+
 class User(Base):
     """
     User model for system access and account ownership.
     """
     __tablename__ = "users"
     
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(Integer, primary_key=True)
     username = Column(String, unique=True, index=True, nullable=False)
     email = Column(String, unique=True, index=True, nullable=False)
     password_hash = Column(String, nullable=False)
     is_active = Column(Boolean, default=True)
-    created_at = Column(DateTime, default=datetime.utcnow)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    created_at = Column(DateTime, server_default=utcnow())
+    updated_at = Column(DateTime, server_default=utcnow(), onupdate=utcnow())
     
     # Relationships
     accounts = relationship("Account", back_populates="owner", cascade="all, delete-orphan")
-    
-    # Indexes and constraints
-    __table_args__ = (
-        Index("ix_users_username_email", "username", "email"),
-    )
 
 class Account(Base):
     """
@@ -33,12 +46,12 @@ class Account(Base):
     """
     __tablename__ = "accounts"
     
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(Integer, primary_key=True)
     name = Column(String, nullable=False)
     account_type = Column(String, nullable=False)  # asset, liability, equity, revenue, expense
     description = Column(String, nullable=True)
-    created_at = Column(DateTime, default=datetime.utcnow)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    created_at = Column(DateTime, server_default=utcnow())
+    updated_at = Column(DateTime, server_default=utcnow(), onupdate=utcnow())
     
     # Foreign keys
     owner_id = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -53,24 +66,10 @@ class Account(Base):
             "account_type IN ('asset', 'liability', 'equity', 'revenue', 'expense')", 
             name="check_valid_account_type"
         ),
-        Index("ix_accounts_owner_id_name", "owner_id", "name"),
-        Index("ix_accounts_account_type", "account_type"),
+        # Account names are unique per owner; also serves owner-only lookups
+        Index("ix_accounts_owner_name", "owner_id", "name", unique=True),
+        Index("ix_accounts_owner_type", "owner_id", "account_type"),
     )
-    
-    @property
-    def balance(self):
-        """
-        Calculate account balance based on transaction entries.
-        For asset and expense accounts: debit - credit
-        For liability, equity, and revenue accounts: credit - debit
-        """
-        debit_sum = sum(entry.debit_amount for entry in self.transaction_entries)
-        credit_sum = sum(entry.credit_amount for entry in self.transaction_entries)
-        
-        if self.account_type in ["asset", "expense"]:
-            return debit_sum - credit_sum
-        else:  # liability, equity, revenue
-            return credit_sum - debit_sum
 
 class Transaction(Base):
     """
@@ -79,12 +78,12 @@ class Transaction(Base):
     """
     __tablename__ = "transactions"
     
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(Integer, primary_key=True)
     reference_number = Column(String, unique=True, index=True, nullable=False)
     description = Column(String, nullable=True)
-    transaction_date = Column(DateTime, default=datetime.utcnow, nullable=False)
-    created_at = Column(DateTime, default=datetime.utcnow)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    transaction_date = Column(DateTime, server_default=utcnow(), nullable=False)
+    created_at = Column(DateTime, server_default=utcnow())
+    updated_at = Column(DateTime, server_default=utcnow(), onupdate=utcnow())
     
     # Foreign keys
     created_by_id = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -96,7 +95,9 @@ class Transaction(Base):
     # Indexes
     __table_args__ = (
         Index("ix_transactions_transaction_date", "transaction_date"),
-        Index("ix_transactions_created_by_id", "created_by_id"),
+        # Supports keyset pagination of a user's transactions, newest first;
+        # also serves plain created_by_id lookups, so no separate index
+        Index("ix_transactions_created_by_date_id", created_by_id, transaction_date.desc(), id.desc()),
     )
 
 class TransactionEntry(Base):
@@ -106,9 +107,9 @@ class TransactionEntry(Base):
     """
     __tablename__ = "transaction_entries"
     
-    id = Column(Integer, primary_key=True, index=True)
-    debit_amount = Column(Float, default=0.0, nullable=False)
-    credit_amount = Column(Float, default=0.0, nullable=False)
+    id = Column(Integer, primary_key=True)
+    debit_amount = Column(Numeric(18, 2), default=0, nullable=False)
+    credit_amount = Column(Numeric(18, 2), default=0, nullable=False)
     description = Column(String, nullable=True)
     
     # Foreign keys
@@ -128,3 +129,24 @@ class TransactionEntry(Base):
         Index("ix_transaction_entries_transaction_id", "transaction_id"),
         Index("ix_transaction_entries_account_id", "account_id"),
     )
+
+# Account balance, aggregated by the database from the account's entries.
+# For asset and expense accounts: debit - credit
+# For liability, equity, and revenue accounts: credit - debit
+# Deferred so plain account loads skip the aggregate; query with
+# options(undefer(Account.balance)) to fetch it in the same SELECT.
+Account.balance = column_property(
+    select(
+        func.coalesce(func.sum(case(
+            (
+                Account.account_type.in_(("asset", "expense")),
+                TransactionEntry.debit_amount - TransactionEntry.credit_amount
+            ),
+            else_=TransactionEntry.credit_amount - TransactionEntry.debit_amount
+        )), 0)
+    )
+    .where(TransactionEntry.account_id == Account.id)
+    .correlate_except(TransactionEntry)
+    .scalar_subquery(),
+    deferred=True
+)
@@ -47,7 +47,7 @@ class AccountRepository(SupabaseRepository[AccountInDB]):
         """
         Update an account.
         """
-        update_data = account_update.dict(exclude_unset=True)
+        update_data = account_update.model_dump(exclude_unset=True, mode="json")
         return await self.update(account_id, update_data)
     
     async def calculate_balance(self, account_id: int) -> float:
@@ -55,29 +55,12 @@ class AccountRepository(SupabaseRepository[AccountInDB]):
         Calculate the balance of an account based on its transaction entries.
         """
         try:
-            # First get the account to determine its type
-            account_response = self.table.select("*").eq("id", account_id).execute()
-            if not account_response.data or len(account_response.data) == 0:
-                return 0.0
-            
-            account = AccountInDB(**account_response.data[0])
-            
-            # Get all transaction entries for this account
-            transaction_entries_table = self.supabase.table("transaction_entries")
-            entries_response = transaction_entries_table.select("*").eq("account_id", account_id).execute()
-            
-            if not entries_response.data:
-                return 0.0
-            
-            # Calculate balance based on account type
-            debit_sum = sum(entry.get("debit_amount", 0) for entry in entries_response.data)
-            credit_sum = sum(entry.get("credit_amount", 0) for entry in entries_response.data)
-            
-            if account.account_type in ["asset", "expense"]:
-                return debit_sum - credit_sum
-            else:  # liability, equity, revenue
-                return credit_sum - debit_sum
-                
+            # Summed in the database by the account_balance function
+            # (scripts/supabase_setup.sql), which also applies the sign
+            # for the account type
+            response = self.supabase.rpc("account_balance", {"aid": account_id}).execute()
+            return float(response.data or 0.0)
         except Exception as e:
+            # Don't report a failed lookup as a zero balance
             logger.error(f"Error calculating account balance: {str(e)}")
-            return 0.0
+            raise
@@ -3,10 +3,11 @@ Supabase repository module for database operations.
 This provides an abstraction layer over Supabase for CRUD operations.
 """
 import logging
-from typing import Dict, List, Any, Optional, Type, TypeVar, Generic
+from typing import Dict, List, Any, Optional, Type, TypeVar, Generic, Sequence, Union
 from pydantic import BaseModel
 
 from app.db.database import get_table, supabase_transaction
+from app.core.supabase_client import get_supabase
 
 logger = logging.getLogger(__name__)
 
@@ -21,6 +22,27 @@ class SupabaseRepository(Generic[T]):
         self.model_class = model_class
         self.table = get_table(table_name)
 
+    @staticmethod
+    def _apply_filters(query, filters: Optional[Dict[str, Any]]):
+        """
+        Add filters to a query: lists and tuples become one IN clause,
+        other values an equality check.
+        """
+        if filters:
+            for key, value in filters.items():
+                if isinstance(value, (list, tuple)):
+                    query = query.in_(key, list(value))
+                else:
+                    query = query.eq(key, value)
+        return query
+
+    @property
+    def supabase(self):
+        """
+        The shared Supabase client, for queries against other tables.
+        """
+        return get_supabase()
+
     async def create(self, data: Dict[str, Any]) -> T:
         """
         Create a new record in the table.
@@ -47,26 +69,43 @@ class SupabaseRepository(Generic[T]):
             logger.error(f"Error getting record by ID from {self.table_name}: {str(e)}")
             raise
 
-    async def get_all(self, filters: Optional[Dict[str, Any]] = None) -> List[T]:
+    async def get_all(
+        self,
+        filters: Optional[Dict[str, Any]] = None,
+        columns: str = "*",
+        limit: Optional[int] = None
+    ) -> Union[List[T], List[Dict[str, Any]]]:
         """
         Get all records, optionally filtered.
+        A list or tuple filter value matches any of its items.
+        With a narrower `columns` selection the rows are returned as dicts,
+        since they would not validate as full models.
         """
         try:
-            query = self.table.select("*")
+            query = self._apply_filters(self.table.select(columns), filters)
             
-            if filters:
-                for key, value in filters.items():
-                    query = query.eq(key, value)
+            if limit is not None:
+                query = query.limit(limit)
             
             response = query.execute()
             
-            if response.data:
-                return [self.model_class(**item) for item in response.data]
-            return []
+            if not response.data:
+                return []
+            if columns != "*":
+                return response.data
+            return [self.model_class(**item) for item in response.data]
         except Exception as e:
             logger.error(f"Error getting records from {self.table_name}: {str(e)}")
             raise
 
+    async def get_by_ids(self, ids: Sequence[int]) -> List[T]:
+        """
+        Get several records by ID in a single request.
+        """
+        if not ids:
+            return []
+        return await self.get_all({"id": list(ids)})
+
     async def update(self, id: int, data: Dict[str, Any]) -> Optional[T]:
         """
         Update a record by ID.
@@ -94,13 +133,10 @@ class SupabaseRepository(Generic[T]):
     async def count(self, filters: Optional[Dict[str, Any]] = None) -> int:
         """
         Count records, optionally filtered.
+        Uses a HEAD request, so only the count header comes back, no rows.
         """
         try:
-            query = self.table.select("count", count="exact")
-            
-            if filters:
-                for key, value in filters.items():
-                    query = query.eq(key, value)
+            query = self._apply_filters(self.table.select("id", count="exact", head=True), filters)
             
             response = query.execute()
             
@@ -1,15 +1,23 @@
 """
 Transaction repository module for Supabase database operations.
 """
+import asyncio
 import logging
-from typing import Dict, List, Any, Optional
+from collections import defaultdict
+from typing import AsyncIterator, Dict, List, Any, Optional, Tuple, Union
+from pydantic import TypeAdapter
 from datetime import datetime
-from app.schemas.schemas import TransactionCreate, TransactionUpdate, TransactionInDB, TransactionEntryCreate
+from app.schemas.schemas import TransactionCreate, TransactionInDB, TransactionEntryCreate
 from app.repositories.supabase_repository import SupabaseRepository
-from app.core.supabase_client import supabase
 
 logger = logging.getLogger(__name__)
 
+# The columns TransactionInDB is built from
+TRANSACTION_COLUMNS = "id,reference_number,description,transaction_date,created_by_id,created_at,updated_at"
+
+# Validates a whole page of rows in a single pydantic-core call
+_TRANSACTION_LIST = TypeAdapter(List[TransactionInDB])
+
 class TransactionRepository(SupabaseRepository[TransactionInDB]):
     """
     Repository for Transaction operations using Supabase.
@@ -25,46 +33,44 @@ class TransactionRepository(SupabaseRepository[TransactionInDB]):
     ) -> Optional[TransactionInDB]:
         """
         Create a new transaction with its entries in a single operation.
-        This implements a basic transaction (no pun intended) to ensure data consistency.
+        Runs the create_transaction_with_entries database function
+        (scripts/supabase_setup.sql), so both inserts commit or roll back together.
         """
         try:
-            # Start a transaction-like operation (Supabase doesn't have true transactions)
-            # First, create the transaction
             transaction_data = {
                 "reference_number": transaction.reference_number,
                 "description": transaction.description,
-                "transaction_date": transaction.transaction_date.isoformat() if transaction.transaction_date else datetime.utcnow().isoformat(),
                 "created_by_id": created_by_id
             }
+            # Leave transaction_date unset so the function defaults it
+            if transaction.transaction_date:
+                transaction_data["transaction_date"] = transaction.transaction_date.isoformat()
             
-            transaction_response = self.table.insert(transaction_data).execute()
-            
-            if not transaction_response.data or len(transaction_response.data) == 0:
-                logger.error("Failed to create transaction")
-                return None
-            
-            transaction_id = transaction_response.data[0]["id"]
-            
-            # Then create all entries
-            entries_table = supabase.table("transaction_entries")
-            for entry in entries:
-                entry_data = {
-                    "transaction_id": transaction_id,
+            # Amounts go as strings so the Decimals reach NUMERIC columns exactly
+            entry_rows = [
+                {
                     "account_id": entry.account_id,
-                    "debit_amount": entry.debit_amount,
-                    "credit_amount": entry.credit_amount,
+                    "debit_amount": str(entry.debit_amount),
+                    "credit_amount": str(entry.credit_amount),
                     "description": entry.description
                 }
-                entries_table.insert(entry_data).execute()
+                for entry in entries
+            ]
+            
+            response = self.supabase.rpc(
+                "create_transaction_with_entries",
+                {"tx": transaction_data, "entries": entry_rows}
+            ).execute()
+            
+            if not response.data:
+                logger.error("Failed to create transaction")
+                return None
             
             # Return the created transaction with its ID
-            return TransactionInDB(**transaction_response.data[0])
+            return TransactionInDB(**response.data)
         
         except Exception as e:
             logger.error(f"Error creating transaction with entries: {str(e)}")
-            # In a real database with transactions, we would rollback here
-            # Since Supabase doesn't support transactions, we'll need to manually clean up
-            # This is a limitation of using Supabase without RLS policies
             raise
     
     async def get_transaction_with_entries(self, transaction_id: int) -> Optional[Dict[str, Any]]:
@@ -72,22 +78,20 @@ class TransactionRepository(SupabaseRepository[TransactionInDB]):
         Get a transaction with all its entries.
         """
         try:
-            # Get the transaction
-            transaction_response = self.table.select("*").eq("id", transaction_id).execute()
+            # Fetch the transaction with its entries embedded, in one request;
+            # PostgREST resolves the embed through the transaction_id foreign key
+            response = self.table.select("*, transaction_entries(*)").eq("id", transaction_id).limit(1).execute()
             
-            if not transaction_response.data or len(transaction_response.data) == 0:
+            if not response.data:
                 return None
             
-            transaction = transaction_response.data[0]
-            
-            # Get all entries for this transaction
-            entries_table = supabase.table("transaction_entries")
-            entries_response = entries_table.select("*").eq("transaction_id", transaction_id).execute()
+            transaction = response.data[0]
+            entries = transaction.pop("transaction_entries", None) or []
             
             # Combine transaction with its entries
             result = {
                 "transaction": transaction,
-                "entries": entries_response.data if entries_response.data else []
+                "entries": entries
             }
             
             return result
@@ -96,6 +100,31 @@ class TransactionRepository(SupabaseRepository[TransactionInDB]):
             logger.error(f"Error getting transaction with entries: {str(e)}")
             raise
     
+    async def get_entries_for_transactions(self, transaction_ids: List[int]) -> Dict[int, List[Dict[str, Any]]]:
+        """
+        Get the entries of several transactions in one request, keyed by transaction ID.
+        Use this when rendering a page of transactions instead of calling
+        get_transaction_with_entries per row.
+        """
+        if not transaction_ids:
+            return {}
+        try:
+            response = (
+                self.supabase.table("transaction_entries")
+                .select("*")
+                .in_("transaction_id", list(transaction_ids))
+                .execute()
+            )
+            
+            entries = defaultdict(list)
+            for row in response.data or []:
+                entries[row["transaction_id"]].append(row)
+            return entries
+        
+        except Exception as e:
+            logger.error(f"Error getting entries for transactions: {str(e)}")
+            raise
+    
     async def get_transactions_by_user(self, user_id: int) -> List[TransactionInDB]:
         """
         Get all transactions created by a specific user.
@@ -106,13 +135,69 @@ class TransactionRepository(SupabaseRepository[TransactionInDB]):
         self, 
         start_date: datetime, 
         end_date: datetime, 
-        user_id: Optional[int] = None
-    ) -> List[TransactionInDB]:
+        user_id: Optional[int] = None,
+        limit: int = 100,
+        cursor: Optional[Tuple[datetime, int]] = None,
+        raw: bool = False
+    ) -> Union[List[TransactionInDB], List[Dict[str, Any]]]:
+        """
+        Get one page of transactions within a date range, optionally filtered by user.
+        
+        Rows are ordered by (transaction_date, id). Pass the (transaction_date, id)
+        of the last row of a page as `cursor` to fetch the next one.
+        With raw=True the rows are returned as the dicts PostgREST sent,
+        skipping model validation.
+        """
+        return self._fetch_date_range_page(start_date, end_date, user_id, limit, cursor, raw)
+    
+    async def iter_by_date_range(
+        self,
+        start_date: datetime,
+        end_date: datetime,
+        user_id: Optional[int] = None,
+        page_size: int = 200
+    ) -> AsyncIterator[List[TransactionInDB]]:
         """
-        Get all transactions within a date range, optionally filtered by user.
+        Yield every page of transactions within a date range, oldest first.
+        
+        While the caller works on one page, the next is already being fetched
+        in a worker thread, so each page's round trip overlaps with that work.
+        """
+        def fetch(cursor):
+            return asyncio.create_task(asyncio.to_thread(
+                self._fetch_date_range_page, start_date, end_date, user_id, page_size, cursor
+            ))
+        
+        next_page = fetch(None)
+        try:
+            while True:
+                page = await next_page
+                if len(page) < page_size:
+                    if page:
+                        yield page
+                    return
+                last = page[-1]
+                next_page = fetch((last.transaction_date, last.id))
+                yield page
+        finally:
+            # The caller stopped early; don't leave the prefetch pending
+            if not next_page.done():
+                next_page.cancel()
+    
+    def _fetch_date_range_page(
+        self,
+        start_date: datetime,
+        end_date: datetime,
+        user_id: Optional[int],
+        limit: int,
+        cursor: Optional[Tuple[datetime, int]],
+        raw: bool = False
+    ) -> Union[List[TransactionInDB], List[Dict[str, Any]]]:
+        """
+        Run one keyset-paginated date range query (blocking).
         """
         try:
-            query = self.table.select("*")
+            query = self.table.select(TRANSACTION_COLUMNS)
             
             # Add date range filter
             query = query.gte("transaction_date", start_date.isoformat())
@@ -122,11 +207,24 @@ class TransactionRepository(SupabaseRepository[TransactionInDB]):
             if user_id is not None:
                 query = query.eq("created_by_id", user_id)
             
+            # Seek past the previous page instead of skipping rows
+            if cursor is not None:
+                cursor_date, cursor_id = cursor
+                ts = cursor_date.isoformat()
+                query = query.or_(
+                    f'transaction_date.gt."{ts}",'
+                    f'and(transaction_date.eq."{ts}",id.gt.{cursor_id})'
+                )
+            
+            query = query.order("transaction_date").order("id").limit(limit)
+            
             response = query.execute()
             
-            if response.data:
-                return [TransactionInDB(**item) for item in response.data]
-            return []
+            if not response.data:
+                return []
+            if raw:
+                return response.data
+            return _TRANSACTION_LIST.validate_python(response.data)
         
         except Exception as e:
             logger.error(f"Error getting transactions by date range: {str(e)}")
@@ -2,13 +2,47 @@
 User repository module for Supabase database operations.
 """
 import logging
-from typing import Dict, List, Any, Optional
+from threading import Lock
+from typing import Dict, List, Any, Iterable, Optional
+from cachetools import TTLCache
 from app.schemas.schemas import UserCreate, UserUpdate, UserInDB
 from app.repositories.supabase_repository import SupabaseRepository
 from app.core.security import get_password_hash
+from app.core.config import USER_CACHE_TTL_SECONDS
 
 logger = logging.getLogger(__name__)
 
+# The columns UserInDB is built from
+USER_COLUMNS = "id,username,email,password_hash,is_active,created_at,updated_at"
+
+# Ids per IN (...) request, keeping the PostgREST URL well under length limits
+USER_ID_BATCH_SIZE = 500
+
+# Short-lived caches of users found by username and by email, shared by all
+# repository instances. Writes through this repository evict the user;
+# changes made elsewhere show up within USER_CACHE_TTL_SECONDS.
+_users_by_username = TTLCache(maxsize=10_000, ttl=USER_CACHE_TTL_SECONDS)
+_users_by_email = TTLCache(maxsize=10_000, ttl=USER_CACHE_TTL_SECONDS)
+# The (username, email) each cached user is stored under, by user ID, so
+# eviction pops its keys instead of scanning both caches
+_cached_user_keys = TTLCache(maxsize=10_000, ttl=USER_CACHE_TTL_SECONDS)
+_user_cache_lock = Lock()
+
+def _cache_user(cache: TTLCache, key: str, user: UserInDB):
+    """Store a user in one of the lookup caches."""
+    with _user_cache_lock:
+        cache[key] = user
+        _cached_user_keys[user.id] = (user.username, user.email)
+
+def _evict_user(user_id: int):
+    """Drop every cached entry for a user."""
+    with _user_cache_lock:
+        keys = _cached_user_keys.pop(user_id, None)
+        if keys is not None:
+            username, email = keys
+            _users_by_username.pop(username, None)
+            _users_by_email.pop(email, None)
+
 class UserRepository(SupabaseRepository[UserInDB]):
     """
     Repository for User operations using Supabase.
@@ -27,16 +61,24 @@ class UserRepository(SupabaseRepository[UserInDB]):
             "password_hash": hashed_password,
             "is_active": True
         }
-        return await self.create(user_data)
+        created = await self.create(user_data)
+        _evict_user(created.id)
+        return created
     
     async def get_by_username(self, username: str) -> Optional[UserInDB]:
         """
         Get a user by username.
         """
+        with _user_cache_lock:
+            cached = _users_by_username.get(username)
+        if cached is not None:
+            return cached
         try:
-            response = self.table.select("*").eq("username", username).execute()
+            response = self.table.select(USER_COLUMNS).eq("username", username).limit(1).execute()
             if response.data and len(response.data) > 0:
-                return UserInDB(**response.data[0])
+                user = UserInDB(**response.data[0])
+                _cache_user(_users_by_username, username, user)
+                return user
             return None
         except Exception as e:
             logger.error(f"Error getting user by username: {str(e)}")
@@ -46,23 +88,52 @@ class UserRepository(SupabaseRepository[UserInDB]):
         """
         Get a user by email.
         """
+        with _user_cache_lock:
+            cached = _users_by_email.get(email)
+        if cached is not None:
+            return cached
         try:
-            response = self.table.select("*").eq("email", email).execute()
+            response = self.table.select(USER_COLUMNS).eq("email", email).limit(1).execute()
             if response.data and len(response.data) > 0:
-                return UserInDB(**response.data[0])
+                user = UserInDB(**response.data[0])
+                _cache_user(_users_by_email, email, user)
+                return user
             return None
         except Exception as e:
             logger.error(f"Error getting user by email: {str(e)}")
             raise
     
+    async def get_users_by_ids(self, ids: Iterable[int]) -> Dict[int, UserInDB]:
+        """
+        Get many users with one request per USER_ID_BATCH_SIZE ids, keyed by ID.
+        Use this instead of calling get_by_id in a loop.
+        """
+        unique_ids = sorted(set(ids))
+        users = {}
+        for start in range(0, len(unique_ids), USER_ID_BATCH_SIZE):
+            batch = unique_ids[start:start + USER_ID_BATCH_SIZE]
+            for user in await self.get_by_ids(batch):
+                users[user.id] = user
+        return users
+    
     async def update_user(self, user_id: int, user_update: UserUpdate) -> Optional[UserInDB]:
         """
         Update a user.
         """
-        update_data = user_update.dict(exclude_unset=True)
+        update_data = user_update.model_dump(exclude_unset=True, mode="json")
         
         # Hash the password if it's being updated
         if "password" in update_data:
             update_data["password_hash"] = get_password_hash(update_data.pop("password"))
         
-        return await self.update(user_id, update_data)
+        updated = await self.update(user_id, update_data)
+        _evict_user(user_id)
+        return updated
+    
+    async def delete(self, id: int) -> bool:
+        """
+        Delete a user and drop it from the lookup caches.
+        """
+        deleted = await super().delete(id)
+        _evict_user(id)
+        return deleted
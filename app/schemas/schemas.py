@@ -1,15 +1,33 @@
-from pydantic import BaseModel, Field, EmailStr, validator
-from typing import List, Optional
+from pydantic import BaseModel, Field, EmailStr, PlainSerializer, validator
+from typing import Annotated, List, Literal, Optional
 from datetime import datetime
+from decimal import Decimal
+
+# Money is validated and summed as an exact Decimal but still sent to
+# clients as a JSON number, so the API's wire format is unchanged.
+Money = Annotated[
+    Decimal,
+    Field(max_digits=18, decimal_places=2),
+    PlainSerializer(float, return_type=float, when_used="json"),
+]
+Balance = Annotated[Decimal, PlainSerializer(float, return_type=float, when_used="json")]
 
 # User schemas
 class UserBase(BaseModel):
     username: str
-    email: EmailStr
+    email: str
 
 class UserCreate(UserBase):
+    # Only client input runs email-validator; emails read back from the
+    # database were validated when they were stored
+    email: EmailStr
     password: str
 
+class UserUpdate(BaseModel):
+    # Fields left out of the request body are not changed
+    email: Optional[EmailStr] = None
+    password: Optional[str] = None
+
 class UserResponse(UserBase):
     id: int
     is_active: bool
@@ -23,27 +41,28 @@ class UserInDB(UserResponse):
     updated_at: Optional[datetime] = None
 
 # Account schemas
+AccountType = Literal['asset', 'liability', 'equity', 'revenue', 'expense']
+
 class AccountBase(BaseModel):
     name: str
-    account_type: str
+    account_type: AccountType
     description: Optional[str] = None
 
-    @validator('account_type')
-    def validate_account_type(cls, v):
-        valid_types = ['asset', 'liability', 'equity', 'revenue', 'expense']
-        if v not in valid_types:
-            raise ValueError(f'account_type must be one of {valid_types}')
-        return v
-
 class AccountCreate(AccountBase):
     pass
 
+class AccountUpdate(BaseModel):
+    # Fields left out of the request body are not changed
+    name: Optional[str] = None
+    account_type: Optional[AccountType] = None
+    description: Optional[str] = None
+
 class AccountResponse(AccountBase):
     id: int
     owner_id: int
     created_at: datetime
     updated_at: datetime
-    balance: float = 0.0
+    balance: Balance = Decimal(0)
 
     class Config:
         from_attributes = True
@@ -54,8 +73,8 @@ class AccountInDB(AccountResponse):
 # Transaction Entry schemas
 class TransactionEntryBase(BaseModel):
     account_id: int
-    debit_amount: float = 0.0
-    credit_amount: float = 0.0
+    debit_amount: Money = Decimal(0)
+    credit_amount: Money = Decimal(0)
     description: Optional[str] = None
 
     @validator('debit_amount', 'credit_amount')
@@ -91,10 +110,13 @@ class TransactionCreate(TransactionBase):
         if not entries or len(entries) < 2:
             raise ValueError('A transaction must have at least two entries')
 
-        total_debit = sum(entry.debit_amount for entry in entries)
-        total_credit = sum(entry.credit_amount for entry in entries)
+        # Amounts are Decimals, so the totals compare exactly
+        total_debit = total_credit = Decimal(0)
+        for entry in entries:
+            total_debit += entry.debit_amount
+            total_credit += entry.credit_amount
 
-        if round(total_debit, 2) != round(total_credit, 2):
+        if total_debit != total_credit:
             raise ValueError('Total debits must equal total credits')
 
         return entries
@@ -120,4 +142,4 @@ class AccountBalance(BaseModel):
     account_id: int
     account_name: str
     account_type: str
-    balance: float
+    balance: Balance
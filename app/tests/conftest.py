@@ -0,0 +1,150 @@
+"""
+Shared pytest setup, loaded before the test modules.
+
+Each test module gets its own in-memory SQLite database with the schema and
+the test user created once. Every test then runs inside a transaction that
+is rolled back afterwards, and API requests are served from that same
+session; modules only add their own seed data on top.
+"""
+from contextlib import contextmanager
+
+import pytest
+from httpx import ASGITransport, AsyncClient
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import StaticPool
+
+from app.core import auth, security
+from app.db.database import Base, get_db
+from app.main import app
+from app.models.models import User
+
+SQLALCHEMY_DATABASE_URL = "sqlite:///:memory:"
+
+# Production bcrypt cost is deliberately slow (~250ms per hash or check).
+# Tests only need valid hashes, so use the minimum cost; verification
+# reads the cost from the hash, which makes logins cheap as well.
+for pwd_context in (auth.pwd_context, security.pwd_context):
+    pwd_context.update(bcrypt__rounds=4)
+
+@pytest.fixture(scope="session", autouse=True)
+def _warmup():
+    # Pay one-time lazy initialisation up front, so it is not charged to
+    # whichever test happens to run first: passlib loads and self-tests its
+    # bcrypt backend on first use.
+    for pwd_context in (auth.pwd_context, security.pwd_context):
+        pwd_context.verify("warmup", pwd_context.hash("warmup"))
+    auth.create_access_token(data={"sub": "warmup"})
+
+# pysqlite handles BEGIN itself and breaks SAVEPOINT; let SQLAlchemy emit it
+def _disable_pysqlite_begin(dbapi_connection, connection_record):
+    dbapi_connection.isolation_level = None
+
+def _emit_begin(conn):
+    conn.exec_driver_sql("BEGIN")
+
+# Throwaway database: skip durability work SQLite would otherwise do per write
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA synchronous=OFF")
+    cursor.execute("PRAGMA journal_mode=MEMORY")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.execute("PRAGMA locking_mode=EXCLUSIVE")
+    cursor.close()
+
+@contextmanager
+def _recording_statements(engine):
+    statements = []
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+
+@pytest.fixture(scope="module")
+def engine():
+    # A fresh in-memory database for this module; StaticPool keeps its
+    # single connection alive for as long as the engine is
+    engine = create_engine(
+        SQLALCHEMY_DATABASE_URL,
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    event.listen(engine, "connect", _disable_pysqlite_begin)
+    event.listen(engine, "connect", _set_sqlite_pragmas)
+    event.listen(engine, "begin", _emit_begin)
+
+    # The database starts empty, so skip the per-table existence checks
+    Base.metadata.create_all(bind=engine, checkfirst=False)
+
+    yield engine
+
+    # The in-memory database goes away with its only connection
+    engine.dispose()
+
+@pytest.fixture(scope="module")
+def test_user_id(engine):
+    # Create the test user once for this module
+    with Session(engine) as db:
+        test_user = User(
+            username="testuser",
+            email="test@example.com",
+            password_hash=auth.get_password_hash("testpassword")
+        )
+        db.add(test_user)
+        db.flush()
+        test_user_id = test_user.id
+        db.commit()
+    return test_user_id
+
+@pytest.fixture(scope="module")
+def token(test_user_id):
+    # Mint one token for the test user, as /auth/token would, instead of
+    # logging in (and running a bcrypt check) for every test
+    return auth.create_access_token(data={"sub": "testuser"})
+
+@pytest.fixture
+def record_statements(engine):
+    # `with record_statements() as statements:` collects the SQL the test
+    # database receives inside the block, for query-count assertions
+    return lambda: _recording_statements(engine)
+
+@pytest.fixture(scope="function")
+def test_db(engine, test_user_id):
+    # Run each test inside a transaction that is rolled back afterwards.
+    # Commits made by the test or the API only release a SAVEPOINT.
+    connection = engine.connect()
+    transaction = connection.begin()
+    db = Session(bind=connection, join_transaction_mode="create_savepoint")
+
+    # Serve API requests from the same session
+    app.dependency_overrides[get_db] = lambda: db
+
+    yield db  # Testing happens here
+
+    # Clean up after the test
+    app.dependency_overrides.pop(get_db, None)
+    db.close()
+    transaction.rollback()
+    connection.close()
+
+@pytest.fixture(autouse=True)
+def _reset_user_cache():
+    # The auth cache is process-global; a user cached while one test's data
+    # was visible must not authenticate requests in the next test
+    yield
+    with auth._user_cache_lock:
+        auth._user_cache.clear()
+
+@pytest.fixture(scope="session")
+def anyio_backend():
+    return "asyncio"
+
+@pytest.fixture
+async def client():
+    # Call the ASGI app in-process on the test's event loop, rather than
+    # through TestClient's per-request thread portal
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://testserver") as client:
+        yield client
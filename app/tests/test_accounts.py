@@ -1,66 +1,24 @@
 import pytest
-from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
-from sqlalchemy.pool import StaticPool
 
-from app.db.database import Base, get_db
 from app.main import app
-from app.models.models import User, Account
-from app.core.auth import get_password_hash
-
-# Create an in-memory SQLite database for testing
-SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
-
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL,
-    connect_args={"check_same_thread": False},
-    poolclass=StaticPool,
-)
-TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-
-# Override the get_db dependency
-def override_get_db():
-    try:
-        db = TestingSessionLocal()
-        yield db
-    finally:
-        db.close()
-
-app.dependency_overrides[get_db] = override_get_db
-
-client = TestClient(app)
-
-@pytest.fixture(scope="function")
-def test_db():
-    # Create the database tables
-    Base.metadata.create_all(bind=engine)
-    
-    # Create a test user
-    db = TestingSessionLocal()
-    password_hash = get_password_hash("testpassword")
-    test_user = User(username="testuser", email="test@example.com", password_hash=password_hash)
-    db.add(test_user)
-    db.commit()
-    
-    yield db  # Testing happens here
-    
-    # Clean up after the test
-    db.close()
-    Base.metadata.drop_all(bind=engine)
-
-@pytest.fixture(scope="function")
-def token(test_db):
-    # Get a token for the test user
-    response = client.post(
-        "/auth/token",
-        data={"username": "testuser", "password": "testpassword"},
-    )
-    return response.json()["access_token"]
-
-def test_create_account(test_db, token):
+from app.models.models import Account
+from app.core.balance_cache import BalanceCache, get_balance_cache
+
+# Every test is a coroutine run by the anyio pytest plugin
+pytestmark = pytest.mark.anyio
+
+@pytest.fixture
+def balance_cache():
+    # Serve balances through a cache backed by an in-memory Redis
+    fakeredis = pytest.importorskip("fakeredis")
+    cache = BalanceCache(fakeredis.FakeRedis())
+    app.dependency_overrides[get_balance_cache] = lambda: cache
+    yield cache
+    app.dependency_overrides.pop(get_balance_cache, None)
+
+async def test_create_account(test_db, token, client):
     # Test creating a new account
-    response = client.post(
+    response = await client.post(
         "/accounts/",
         headers={"Authorization": f"Bearer {token}"},
         json={
@@ -75,15 +33,28 @@ def test_create_account(test_db, token):
     assert data["account_type"] == "asset"
     assert data["description"] == "Cash on hand"
 
-def test_get_accounts(test_db, token):
+async def test_create_account_duplicate_name(test_db, token, test_user_id, client):
+    # Create a test account
+    test_db.add(Account(name="Cash", account_type="asset", owner_id=test_user_id))
+    test_db.commit()
+    
+    # Test that a second account with the same name is rejected
+    response = await client.post(
+        "/accounts/",
+        headers={"Authorization": f"Bearer {token}"},
+        json={"name": "Cash", "account_type": "asset"},
+    )
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Account with this name already exists"
+
+async def test_get_accounts(test_db, token, test_user_id, client):
     # Create a test account
-    user = test_db.query(User).filter(User.username == "testuser").first()
-    account = Account(name="Test Account", account_type="asset", owner_id=user.id)
+    account = Account(name="Test Account", account_type="asset", owner_id=test_user_id)
     test_db.add(account)
     test_db.commit()
     
     # Test getting all accounts
-    response = client.get(
+    response = await client.get(
         "/accounts/",
         headers={"Authorization": f"Bearer {token}"},
     )
@@ -93,15 +64,66 @@ def test_get_accounts(test_db, token):
     assert data[0]["name"] == "Test Account"
     assert data[0]["account_type"] == "asset"
 
-def test_get_account_by_id(test_db, token):
+async def test_get_accounts_invalid_type(test_db, token, client):
+    response = await client.get(
+        "/accounts/?account_type=bogus",
+        headers={"Authorization": f"Bearer {token}"},
+    )
+    assert response.status_code == 400
+    assert "Invalid account type" in response.json()["detail"]
+
+async def test_get_accounts_cursor_pagination(test_db, token, test_user_id, client):
+    # Create three test accounts
+    for name in ("Account A", "Account B", "Account C"):
+        test_db.add(Account(name=name, account_type="asset", owner_id=test_user_id))
+    test_db.commit()
+    
+    # First page
+    response = await client.get(
+        "/accounts/?limit=2",
+        headers={"Authorization": f"Bearer {token}"},
+    )
+    assert response.status_code == 200
+    assert [a["name"] for a in response.json()] == ["Account A", "Account B"]
+    cursor = response.headers["X-Next-Cursor"]
+    
+    # Second (last) page
+    response = await client.get(
+        f"/accounts/?limit=2&cursor={cursor}",
+        headers={"Authorization": f"Bearer {token}"},
+    )
+    assert response.status_code == 200
+    assert [a["name"] for a in response.json()] == ["Account C"]
+    assert "X-Next-Cursor" not in response.headers
+
+async def test_get_accounts_limit_zero(test_db, token, test_user_id, client):
+    test_db.add(Account(name="Account A", account_type="asset", owner_id=test_user_id))
+    test_db.commit()
+    
+    response = await client.get(
+        "/accounts/?limit=0",
+        headers={"Authorization": f"Bearer {token}"},
+    )
+    assert response.status_code == 200
+    assert response.json() == []
+    assert "X-Next-Cursor" not in response.headers
+
+async def test_get_accounts_invalid_cursor(test_db, token, client):
+    response = await client.get(
+        "/accounts/?cursor=not-a-cursor",
+        headers={"Authorization": f"Bearer {token}"},
+    )
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Invalid cursor"
+
+async def test_get_account_by_id(test_db, token, test_user_id, client):
     # Create a test account
-    user = test_db.query(User).filter(User.username == "testuser").first()
-    account = Account(name="Test Account", account_type="asset", owner_id=user.id)
+    account = Account(name="Test Account", account_type="asset", owner_id=test_user_id)
     test_db.add(account)
     test_db.commit()
     
     # Test getting an account by ID
-    response = client.get(
+    response = await client.get(
         f"/accounts/{account.id}",
         headers={"Authorization": f"Bearer {token}"},
     )
@@ -109,16 +131,122 @@ def test_get_account_by_id(test_db, token):
     data = response.json()
     assert data["name"] == "Test Account"
     assert data["account_type"] == "asset"
+    assert "X-Process-Time" in response.headers
+
+async def test_account_responses_load_balance_in_one_select(record_statements, test_db, token, client):
+    # The balance is a deferred aggregate; responses must not lazy-load it
+    with record_statements() as statements:
+        response = await client.post(
+            "/accounts/",
+            headers={"Authorization": f"Bearer {token}"},
+            json={"name": "Cash", "account_type": "asset"},
+        )
+        assert response.status_code == 201
+        assert response.json()["balance"] == 0
+        account_id = response.json()["id"]
+        
+        statements.clear()
+        response = await client.get(
+            f"/accounts/{account_id}",
+            headers={"Authorization": f"Bearer {token}"},
+        )
+        assert response.status_code == 200
+    
+    account_selects = [s for s in statements if s.lstrip().upper().startswith("SELECT") and "accounts" in s]
+    assert len(account_selects) == 1
+
+async def test_get_account_balance_etag(test_db, token, test_user_id, client):
+    # Create a test account
+    account = Account(name="Test Account", account_type="asset", owner_id=test_user_id)
+    test_db.add(account)
+    test_db.commit()
+    
+    response = await client.get(
+        f"/accounts/{account.id}/balance",
+        headers={"Authorization": f"Bearer {token}"},
+    )
+    assert response.status_code == 200
+    assert response.json()["balance"] == 0
+    etag = response.headers["ETag"]
+    
+    # An unchanged balance is not re-sent
+    response = await client.get(
+        f"/accounts/{account.id}/balance",
+        headers={"Authorization": f"Bearer {token}", "If-None-Match": etag},
+    )
+    assert response.status_code == 304
+    
+    # Renaming the account changes the payload, and with it the ETag
+    response = await client.put(
+        f"/accounts/{account.id}",
+        headers={"Authorization": f"Bearer {token}"},
+        json={"name": "Renamed Account", "account_type": "asset"},
+    )
+    assert response.status_code == 200
+    response = await client.get(
+        f"/accounts/{account.id}/balance",
+        headers={"Authorization": f"Bearer {token}", "If-None-Match": etag},
+    )
+    assert response.status_code == 200
+    assert response.json()["account_name"] == "Renamed Account"
+
+async def test_get_account_balance_cached(test_db, token, test_user_id, balance_cache, client):
+    # Create a test account
+    account = Account(name="Test Account", account_type="asset", owner_id=test_user_id)
+    test_db.add(account)
+    test_db.commit()
+    
+    response = await client.get(
+        f"/accounts/{account.id}/balance",
+        headers={"Authorization": f"Bearer {token}"},
+    )
+    assert response.status_code == 200
+    etag = response.headers["ETag"]
+    assert balance_cache.get(account.id)["etag"] == etag
+    
+    # A change made behind the API's back is not seen until the entry expires
+    account.name = "Changed Directly"
+    test_db.commit()
+    response = await client.get(
+        f"/accounts/{account.id}/balance",
+        headers={"Authorization": f"Bearer {token}"},
+    )
+    assert response.json()["account_name"] == "Test Account"
+    assert response.json()["balance"] == 0
+    
+    # A write through the API invalidates the entry
+    response = await client.put(
+        f"/accounts/{account.id}",
+        headers={"Authorization": f"Bearer {token}"},
+        json={"name": "Renamed Account", "account_type": "asset"},
+    )
+    assert response.status_code == 200
+    assert balance_cache.get(account.id) is None
+    response = await client.get(
+        f"/accounts/{account.id}/balance",
+        headers={"Authorization": f"Bearer {token}", "If-None-Match": etag},
+    )
+    assert response.status_code == 200
+    assert response.json()["account_name"] == "Renamed Account"
+
+async def test_balance_cache_skips_stale_store(balance_cache):
+    # A balance read before a write must not be cached after it
+    version = balance_cache.version(1)
+    balance_cache.invalidate([1])
+    balance_cache.store(1, {"owner_id": 1, "balance": {}, "etag": 'W/"x"'}, version)
+    assert balance_cache.get(1) is None
+    
+    balance_cache.store(1, {"owner_id": 1, "balance": {}, "etag": 'W/"x"'}, balance_cache.version(1))
+    assert balance_cache.get(1) is not None
 
-def test_update_account(test_db, token):
+async def test_update_account(test_db, token, test_user_id, client):
     # Create a test account
-    user = test_db.query(User).filter(User.username == "testuser").first()
-    account = Account(name="Test Account", account_type="asset", owner_id=user.id)
+    account = Account(name="Test Account", account_type="asset", owner_id=test_user_id)
     test_db.add(account)
     test_db.commit()
     
     # Test updating an account
-    response = client.put(
+    response = await client.put(
         f"/accounts/{account.id}",
         headers={"Authorization": f"Bearer {token}"},
         json={
@@ -133,22 +261,21 @@ def test_update_account(test_db, token):
     assert data["account_type"] == "liability"
     assert data["description"] == "Updated description"
 
-def test_delete_account(test_db, token):
+async def test_delete_account(test_db, token, test_user_id, client):
     # Create a test account
-    user = test_db.query(User).filter(User.username == "testuser").first()
-    account = Account(name="Test Account", account_type="asset", owner_id=user.id)
+    account = Account(name="Test Account", account_type="asset", owner_id=test_user_id)
     test_db.add(account)
     test_db.commit()
     
     # Test deleting an account
-    response = client.delete(
+    response = await client.delete(
         f"/accounts/{account.id}",
         headers={"Authorization": f"Bearer {token}"},
     )
     assert response.status_code == 204
     
     # Verify the account is deleted
-    response = client.get(
+    response = await client.get(
         f"/accounts/{account.id}",
         headers={"Authorization": f"Bearer {token}"},
     )
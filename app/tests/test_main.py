@@ -0,0 +1,89 @@
+import pytest
+from fastapi import FastAPI
+
+from app import main
+
+# Every test is a coroutine run by the anyio pytest plugin
+pytestmark = pytest.mark.anyio
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+@pytest.fixture
+def probes(monkeypatch):
+    # Stand in for the database and Supabase, counting how often each is probed
+    calls = {"database": 0, "supabase": 0}
+    results = {"database": "connected", "supabase": "connected"}
+    def probe(name):
+        def run():
+            calls[name] += 1
+            return results[name]
+        return run
+    monkeypatch.setattr(main, "_probe_database", probe("database"))
+    monkeypatch.setattr(main, "_probe_supabase", probe("supabase"))
+    monkeypatch.setattr(main, "time", Clock())
+    monkeypatch.setattr(main, "_health_cache", {"checked_at": 0.0, "body": None, "status_code": 200})
+    return calls, results
+
+async def test_health_check_is_cached(probes, client):
+    """Test that /health reuses its result for HEALTH_CACHE_TTL_SECONDS"""
+    calls, _ = probes
+
+    response = await client.get("/health")
+    assert response.status_code == 200
+    assert response.json()["status"] == "ok"
+
+    main.time.now += main.HEALTH_CACHE_TTL_SECONDS - 0.1
+    cached = await client.get("/health")
+    assert cached.status_code == 200
+    assert cached.json() == response.json()
+    assert calls == {"database": 1, "supabase": 1}
+
+    main.time.now += 0.1
+    await client.get("/health")
+    assert calls == {"database": 2, "supabase": 2}
+
+async def test_degraded_health_check_is_cached(probes, client):
+    """Test that a failed check keeps answering 503 until the TTL runs out"""
+    calls, results = probes
+    results["supabase"] = "disconnected"
+
+    response = await client.get("/health")
+    assert response.status_code == 503
+    assert response.json()["status"] == "degraded"
+
+    # Recovered, but the cached result is still served
+    results["supabase"] = "connected"
+    cached = await client.get("/health")
+    assert cached.status_code == 503
+    assert cached.json() == response.json()
+    assert calls == {"database": 1, "supabase": 1}
+
+    main.time.now += main.HEALTH_CACHE_TTL_SECONDS
+    response = await client.get("/health")
+    assert response.status_code == 200
+
+async def test_read_root_uses_static_url(client):
+    response = await client.get("/")
+    assert response.status_code == 200
+    assert f'href="{main.STATIC_URL}/css/styles.css"' in response.text
+
+def test_render_index_uses_static_url():
+    html = main.render_index("https://cdn.example.com/static").decode("utf-8")
+    assert 'href="https://cdn.example.com/static/css/styles.css"' in html
+    assert 'src="https://cdn.example.com/static/js/main.js"' in html
+
+@pytest.mark.parametrize("debug, static_url, mounted", [
+    (False, "/static", True),
+    (False, "https://cdn.example.com/static", False),
+    (True, "https://cdn.example.com/static", True),
+])
+def test_serve_static_files(debug, static_url, mounted):
+    """Test that /static is only served by the app when nothing else serves it"""
+    app = FastAPI()
+    main.serve_static_files(app, debug=debug, static_url=static_url)
+    assert any(getattr(route, "path", None) == "/static" for route in app.routes) == mounted
@@ -0,0 +1,252 @@
+"""
+Tests for the Supabase repositories, run against a stubbed client that
+records the PostgREST calls each query builds instead of sending them.
+"""
+import asyncio
+import threading
+from datetime import datetime
+
+import pytest
+
+from app.db import database
+from app.repositories import supabase_repository, user_repository
+from app.repositories.account_repository import AccountRepository
+from app.repositories.transaction_repository import TransactionRepository
+from app.repositories.user_repository import UserRepository
+from app.schemas.schemas import AccountUpdate, TransactionCreate, UserUpdate
+
+# Every test is a coroutine run by the anyio pytest plugin
+pytestmark = pytest.mark.anyio
+
+class FakeResponse:
+    def __init__(self, data):
+        self.data = data
+        self.count = None
+
+class FakeQuery:
+    """A PostgREST query builder that records its calls."""
+    def __init__(self, client, target):
+        self.client = client
+        self.calls = [target]
+
+    def __getattr__(self, name):
+        def method(*args, **kwargs):
+            self.calls.append((name, args))
+            return self
+        return method
+
+    def execute(self):
+        self.client.queries.append(self.calls)
+        return FakeResponse(self.client.respond(self.calls))
+
+class FakeSupabase:
+    """Answers each executed query with the next scripted response."""
+    def __init__(self, responses=()):
+        self.responses = list(responses)
+        self.queries = []
+
+    def respond(self, calls):
+        return self.responses.pop(0)
+
+    def table(self, name):
+        return FakeQuery(self, ("table", (name,)))
+
+    def rpc(self, name, params):
+        return FakeQuery(self, ("rpc", (name, params)))
+
+@pytest.fixture
+def fake_supabase(monkeypatch):
+    client = FakeSupabase()
+    monkeypatch.setattr(database, "get_supabase", lambda: client)
+    monkeypatch.setattr(supabase_repository, "get_supabase", lambda: client)
+    return client
+
+def _transaction_row(id, transaction_date):
+    return {
+        "id": id,
+        "reference_number": f"REF-{id}",
+        "description": None,
+        "transaction_date": transaction_date.isoformat(),
+        "created_by_id": 1,
+        "created_at": transaction_date.isoformat(),
+        "updated_at": transaction_date.isoformat(),
+    }
+
+def _or_filters(calls):
+    return [args[0] for name, args in calls if name == "or_"]
+
+START = datetime(2024, 1, 1)
+END = datetime(2024, 12, 31)
+
+async def test_create_transaction_with_entries_calls_rpc(fake_supabase):
+    """Test that the transaction and its entries go out in one RPC call"""
+    fake_supabase.responses.append(_transaction_row(7, datetime(2024, 3, 1)))
+    transaction = TransactionCreate(
+        reference_number="REF-7",
+        entries=[
+            {"account_id": 1, "debit_amount": "10.10"},
+            {"account_id": 2, "credit_amount": "10.10"},
+        ],
+    )
+
+    created = await TransactionRepository().create_transaction_with_entries(
+        transaction, transaction.entries, created_by_id=1
+    )
+
+    assert created.id == 7
+    [calls] = fake_supabase.queries
+    assert calls[0][0] == "rpc"
+    name, params = calls[0][1]
+    assert name == "create_transaction_with_entries"
+    # No date was given, so the database function defaults it
+    assert params["tx"] == {"reference_number": "REF-7", "description": None, "created_by_id": 1}
+    assert [(e["account_id"], e["debit_amount"], e["credit_amount"]) for e in params["entries"]] == [
+        (1, "10.10", "0"),
+        (2, "0", "10.10"),
+    ]
+
+async def test_date_range_first_page_has_no_keyset_filter(fake_supabase):
+    fake_supabase.responses.append([])
+
+    assert await TransactionRepository().get_transactions_by_date_range(START, END, user_id=1) == []
+
+    [calls] = fake_supabase.queries
+    assert _or_filters(calls) == []
+    assert ("eq", ("created_by_id", 1)) in calls
+    assert calls[-2:] == [("order", ("id",)), ("limit", (100,))]
+
+async def test_date_range_cursor_seeks_past_previous_page(fake_supabase):
+    fake_supabase.responses.append([_transaction_row(5, datetime(2024, 2, 1))])
+
+    page = await TransactionRepository().get_transactions_by_date_range(
+        START, END, cursor=(datetime(2024, 1, 15, 9, 30), 4), raw=True
+    )
+
+    assert page == [_transaction_row(5, datetime(2024, 2, 1))]
+    [calls] = fake_supabase.queries
+    assert _or_filters(calls) == [
+        'transaction_date.gt."2024-01-15T09:30:00",'
+        'and(transaction_date.eq."2024-01-15T09:30:00",id.gt.4)'
+    ]
+
+async def test_iter_by_date_range_prefetches_next_page(fake_supabase):
+    """Test that the next page is requested before the caller asks for it"""
+    first = [_transaction_row(1, datetime(2024, 1, 1)), _transaction_row(2, datetime(2024, 1, 2))]
+    second = [_transaction_row(3, datetime(2024, 1, 3))]
+    fake_supabase.responses.extend([first, second])
+    second_requested = threading.Event()
+    respond = fake_supabase.respond
+    def respond_and_signal(calls):
+        if _or_filters(calls):
+            second_requested.set()
+        return respond(calls)
+    fake_supabase.respond = respond_and_signal
+
+    pages = TransactionRepository().iter_by_date_range(START, END, page_size=2)
+    page = await pages.__anext__()
+    assert [t.id for t in page] == [1, 2]
+    # The caller still holds the first page; the second is already on its way
+    assert await asyncio.to_thread(second_requested.wait, 5)
+
+    page = await pages.__anext__()
+    assert [t.id for t in page] == [3]
+    with pytest.raises(StopAsyncIteration):
+        await pages.__anext__()
+
+    # The second request continues from the last row of the first page
+    assert _or_filters(fake_supabase.queries[1]) == [
+        'transaction_date.gt."2024-01-02T00:00:00",'
+        'and(transaction_date.eq."2024-01-02T00:00:00",id.gt.2)'
+    ]
+
+def _account_row(id, **fields):
+    row = {
+        "id": id,
+        "name": "Cash",
+        "account_type": "asset",
+        "description": None,
+        "owner_id": 1,
+        "created_at": "2024-01-01T00:00:00",
+        "updated_at": "2024-01-01T00:00:00",
+    }
+    row.update(fields)
+    return row
+
+async def test_update_account_sends_only_set_fields(fake_supabase):
+    fake_supabase.responses.append([_account_row(3, name="Petty cash")])
+
+    updated = await AccountRepository().update_account(3, AccountUpdate(name="Petty cash"))
+
+    assert updated.name == "Petty cash"
+    [calls] = fake_supabase.queries
+    assert calls[1:] == [("update", ({"name": "Petty cash"},)), ("eq", ("id", 3))]
+
+async def test_calculate_balance_uses_rpc(fake_supabase):
+    """Test that the balance is summed by the database, in one call"""
+    fake_supabase.responses.append("125.50")
+
+    assert await AccountRepository().calculate_balance(3) == 125.5
+
+    [calls] = fake_supabase.queries
+    assert calls == [("rpc", ("account_balance", {"aid": 3}))]
+
+async def test_calculate_balance_failure_is_raised(fake_supabase):
+    """Test that a failed RPC (e.g. a missing function) is not read as a zero balance"""
+    def fail(calls):
+        raise RuntimeError("function account_balance(integer) does not exist")
+    fake_supabase.respond = fail
+
+    with pytest.raises(RuntimeError):
+        await AccountRepository().calculate_balance(3)
+
+@pytest.fixture
+def user_caches():
+    # The user lookup caches are module-global; start and end each test empty
+    caches = (user_repository._users_by_username, user_repository._users_by_email, user_repository._cached_user_keys)
+    for cache in caches:
+        cache.clear()
+    yield
+    for cache in caches:
+        cache.clear()
+
+def _user_row(id, **fields):
+    row = {
+        "id": id,
+        "username": "alice",
+        "email": "alice@example.com",
+        "password_hash": "hash",
+        "is_active": True,
+        "created_at": "2024-01-01T00:00:00",
+        "updated_at": "2024-01-01T00:00:00",
+    }
+    row.update(fields)
+    return row
+
+async def test_user_lookups_are_cached(fake_supabase, user_caches):
+    fake_supabase.responses.extend([[_user_row(1)], [_user_row(1)]])
+    repository = UserRepository()
+
+    for _ in range(2):
+        assert (await repository.get_by_username("alice")).id == 1
+        assert (await repository.get_by_email("alice@example.com")).id == 1
+
+    assert len(fake_supabase.queries) == 2
+
+async def test_update_user_evicts_cached_lookups(fake_supabase, user_caches):
+    """Test that a write drops the user from both lookup caches, and only that user"""
+    fake_supabase.responses.extend([
+        [_user_row(1)],
+        [_user_row(1)],
+        [_user_row(2, username="bob", email="bob@example.com")],
+        [_user_row(1, email="new@example.com")],
+    ])
+    repository = UserRepository()
+    await repository.get_by_username("alice")
+    await repository.get_by_email("alice@example.com")
+    await repository.get_by_username("bob")
+
+    await repository.update_user(1, UserUpdate(email="new@example.com"))
+
+    assert "alice" not in user_repository._users_by_username
+    assert "alice@example.com" not in user_repository._users_by_email
+    assert "bob" in user_repository._users_by_username
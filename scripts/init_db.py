@@ -0,0 +1,213 @@
+#!/usr/bin/env python
+"""
+Script to initialize the database schema for the accounting backend.
+Run this once per deploy (Railway runs it as the pre-deploy command) instead of
+creating tables from every application worker on boot.
+"""
+import os
+import sys
+import logging
+from dotenv import load_dotenv
+
+# Add the parent directory to the path so we can import from app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Load environment variables from .env file
+load_dotenv()
+
+from app.db.database import engine, Base, SessionLocal
+from app.models.models import User
+from app.core.auth import get_password_hash
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+)
+logger = logging.getLogger(__name__)
+
+# Changes create_all cannot make. It only creates tables that don't exist
+# yet (with their indexes) and never alters an existing table, so each
+# schema change to the models also needs a step here for databases created
+# before it. Every step is idempotent and runs in order, in its own
+# transaction, on every deploy.
+MIGRATIONS = (
+    ("drop redundant indexes", """
+        -- Primary keys are already indexed; username and email each have a unique index
+        DROP INDEX IF EXISTS ix_users_id;
+        DROP INDEX IF EXISTS ix_accounts_id;
+        DROP INDEX IF EXISTS ix_transactions_id;
+        DROP INDEX IF EXISTS ix_transaction_entries_id;
+        DROP INDEX IF EXISTS ix_users_username_email;
+    """),
+    ("owner-scoped account indexes", """
+        -- Fails, and stops the deploy, if an owner already has duplicate account names
+        CREATE UNIQUE INDEX IF NOT EXISTS ix_accounts_owner_name ON accounts (owner_id, name);
+        CREATE INDEX IF NOT EXISTS ix_accounts_owner_type ON accounts (owner_id, account_type);
+        DROP INDEX IF EXISTS ix_accounts_owner_id_name;
+        DROP INDEX IF EXISTS ix_accounts_account_type;
+    """),
+    ("transaction keyset index", """
+        CREATE INDEX IF NOT EXISTS ix_transactions_created_by_date_id
+            ON transactions (created_by_id, transaction_date DESC, id DESC);
+        DROP INDEX IF EXISTS ix_transactions_created_by_id;
+    """),
+    ("exact decimal entry amounts", """
+        -- Only rewrite the table while the columns still have another type
+        DO $$
+        BEGIN
+            IF EXISTS (
+                SELECT 1 FROM information_schema.columns
+                WHERE table_schema = current_schema()
+                  AND table_name = 'transaction_entries'
+                  AND column_name IN ('debit_amount', 'credit_amount')
+                  AND (data_type <> 'numeric'
+                       OR numeric_precision IS DISTINCT FROM 18
+                       OR numeric_scale IS DISTINCT FROM 2)
+            ) THEN
+                ALTER TABLE transaction_entries
+                    ALTER COLUMN debit_amount TYPE NUMERIC(18, 2),
+                    ALTER COLUMN credit_amount TYPE NUMERIC(18, 2);
+            END IF;
+        END $$;
+    """),
+    ("transaction_date server default", """
+        -- The model no longer sends a date when the client leaves it out
+        ALTER TABLE transactions ALTER COLUMN transaction_date SET DEFAULT timezone('utc', CURRENT_TIMESTAMP);
+    """),
+    ("created_at/updated_at server defaults", """
+        -- The models stamp inserts with the database clock, in UTC, instead of sending a value
+        ALTER TABLE users ALTER COLUMN created_at SET DEFAULT timezone('utc', CURRENT_TIMESTAMP);
+        ALTER TABLE users ALTER COLUMN updated_at SET DEFAULT timezone('utc', CURRENT_TIMESTAMP);
+        ALTER TABLE accounts ALTER COLUMN created_at SET DEFAULT timezone('utc', CURRENT_TIMESTAMP);
+        ALTER TABLE accounts ALTER COLUMN updated_at SET DEFAULT timezone('utc', CURRENT_TIMESTAMP);
+        ALTER TABLE transactions ALTER COLUMN created_at SET DEFAULT timezone('utc', CURRENT_TIMESTAMP);
+        ALTER TABLE transactions ALTER COLUMN updated_at SET DEFAULT timezone('utc', CURRENT_TIMESTAMP);
+    """),
+    ("double-entry balance trigger", """
+        -- Total debits must equal total credits per transaction. Deferred to
+        -- commit, so all of a transaction's entries can be written first.
+        CREATE OR REPLACE FUNCTION check_transaction_balanced()
+        RETURNS TRIGGER
+        LANGUAGE plpgsql
+        AS $$
+        DECLARE
+            tid INTEGER := COALESCE(NEW.transaction_id, OLD.transaction_id);
+            net NUMERIC;
+        BEGIN
+            SELECT COALESCE(SUM(debit_amount - credit_amount), 0) INTO net
+            FROM transaction_entries
+            WHERE transaction_id = tid;
+
+            IF net <> 0 THEN
+                RAISE EXCEPTION 'Transaction % is unbalanced: debits - credits = %', tid, net;
+            END IF;
+
+            RETURN NULL;
+        END;
+        $$;
+
+        DROP TRIGGER IF EXISTS trg_transaction_entries_balanced ON transaction_entries;
+        CREATE CONSTRAINT TRIGGER trg_transaction_entries_balanced
+            AFTER INSERT OR UPDATE OR DELETE ON transaction_entries
+            DEFERRABLE INITIALLY DEFERRED
+            FOR EACH ROW EXECUTE FUNCTION check_transaction_balanced();
+    """),
+    ("create_transaction_with_entries function", """
+        -- Called by TransactionRepository.create_transaction_with_entries (via supabase.rpc)
+        CREATE OR REPLACE FUNCTION create_transaction_with_entries(tx JSONB, entries JSONB)
+        RETURNS transactions
+        LANGUAGE plpgsql
+        AS $$
+        DECLARE
+            created transactions;
+        BEGIN
+            INSERT INTO transactions (reference_number, description, transaction_date, created_by_id)
+            VALUES (
+                tx->>'reference_number',
+                tx->>'description',
+                COALESCE((tx->>'transaction_date')::TIMESTAMP, timezone('utc', CURRENT_TIMESTAMP)),
+                (tx->>'created_by_id')::INTEGER
+            )
+            RETURNING * INTO created;
+
+            INSERT INTO transaction_entries (transaction_id, account_id, debit_amount, credit_amount, description)
+            SELECT
+                created.id,
+                (e->>'account_id')::INTEGER,
+                COALESCE((e->>'debit_amount')::NUMERIC, 0),
+                COALESCE((e->>'credit_amount')::NUMERIC, 0),
+                e->>'description'
+            FROM jsonb_array_elements(entries) AS e;
+
+            RETURN created;
+        END;
+        $$;
+    """),
+    ("account_balance function", """
+        -- Called by AccountRepository.calculate_balance (via supabase.rpc)
+        CREATE OR REPLACE FUNCTION account_balance(aid INTEGER)
+        RETURNS NUMERIC
+        LANGUAGE sql
+        STABLE
+        AS $$
+            SELECT COALESCE(
+                CASE (SELECT account_type FROM accounts WHERE id = aid)
+                    WHEN 'asset' THEN SUM(debit_amount - credit_amount)
+                    WHEN 'expense' THEN SUM(debit_amount - credit_amount)
+                    ELSE SUM(credit_amount - debit_amount)
+                END,
+                0
+            )
+            FROM transaction_entries
+            WHERE account_id = aid;
+        $$;
+    """),
+)
+
+def create_tables():
+    """Create the tables that don't exist yet, with their indexes."""
+    Base.metadata.create_all(bind=engine)
+    logger.info("Database tables created successfully")
+
+def apply_migrations():
+    """Bring tables that already existed up to date with the models."""
+    if engine.dialect.name != "postgresql":
+        logger.info(f"Skipping migrations, which are written for PostgreSQL (database is {engine.dialect.name})")
+        return
+    
+    for name, ddl in MIGRATIONS:
+        logger.info(f"Applying migration: {name}")
+        # The DDL has no bind parameters; don't let the driver treat % as one
+        with engine.begin() as conn:
+            conn.execution_options(no_parameters=True).exec_driver_sql(ddl)
+    logger.info("Database migrations applied successfully")
+
+def create_admin_user():
+    """Create the default admin user if no users exist."""
+    db = SessionLocal()
+    try:
+        if db.query(User.id).first() is None:
+            db.add(User(
+                username="admin",
+                email="admin@example.com",
+                password_hash=get_password_hash("admin"),
+                is_active=True
+            ))
+            db.commit()
+            logger.info("Created default admin user")
+    finally:
+        db.close()
+
+def main():
+    """Main function to initialize the database."""
+    try:
+        create_tables()
+        apply_migrations()
+        create_admin_user()
+    except Exception as e:
+        logger.error(f"Error initializing database: {str(e)}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
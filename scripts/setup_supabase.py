@@ -14,7 +14,9 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 # Load environment variables from .env file
 load_dotenv()
 
-from app.core.supabase_client import supabase
+from app.core.supabase_client import get_supabase
+
+supabase = get_supabase()
 
 # Configure logging
 logging.basicConfig(
@@ -23,77 +25,205 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# DDL for each table, in dependency order
+USERS_DDL = """
+    CREATE TABLE IF NOT EXISTS users (
+        id SERIAL PRIMARY KEY,
+        username VARCHAR(255) UNIQUE NOT NULL,
+        email VARCHAR(255) UNIQUE NOT NULL,
+        password_hash VARCHAR(255) NOT NULL,
+        is_active BOOLEAN DEFAULT TRUE,
+        created_at TIMESTAMP DEFAULT timezone('utc', CURRENT_TIMESTAMP),
+        updated_at TIMESTAMP DEFAULT timezone('utc', CURRENT_TIMESTAMP)
+    );
+    
+    -- Tables created before the timestamp columns had UTC server defaults
+    ALTER TABLE users ALTER COLUMN created_at SET DEFAULT timezone('utc', CURRENT_TIMESTAMP);
+    ALTER TABLE users ALTER COLUMN updated_at SET DEFAULT timezone('utc', CURRENT_TIMESTAMP);
+    
+    -- The primary key and the unique indexes already cover these
+    DROP INDEX IF EXISTS ix_users_id;
+    DROP INDEX IF EXISTS ix_users_username_email;
+"""
+
+ACCOUNTS_DDL = """
+    CREATE TABLE IF NOT EXISTS accounts (
+        id SERIAL PRIMARY KEY,
+        name VARCHAR(255) NOT NULL,
+        account_type VARCHAR(50) NOT NULL,
+        description TEXT,
+        owner_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+        created_at TIMESTAMP DEFAULT timezone('utc', CURRENT_TIMESTAMP),
+        updated_at TIMESTAMP DEFAULT timezone('utc', CURRENT_TIMESTAMP),
+        CONSTRAINT check_valid_account_type CHECK (account_type IN ('asset', 'liability', 'equity', 'revenue', 'expense'))
+    );
+    
+    ALTER TABLE accounts ALTER COLUMN created_at SET DEFAULT timezone('utc', CURRENT_TIMESTAMP);
+    ALTER TABLE accounts ALTER COLUMN updated_at SET DEFAULT timezone('utc', CURRENT_TIMESTAMP);
+    
+    DROP INDEX IF EXISTS ix_accounts_id;
+    DROP INDEX IF EXISTS ix_accounts_owner_id_name;
+    DROP INDEX IF EXISTS ix_accounts_account_type;
+    CREATE UNIQUE INDEX IF NOT EXISTS ix_accounts_owner_name ON accounts (owner_id, name);
+    CREATE INDEX IF NOT EXISTS ix_accounts_owner_type ON accounts (owner_id, account_type);
+"""
+
+TRANSACTIONS_DDL = """
+    CREATE TABLE IF NOT EXISTS transactions (
+        id SERIAL PRIMARY KEY,
+        reference_number VARCHAR(255) UNIQUE NOT NULL,
+        description TEXT,
+        transaction_date TIMESTAMP NOT NULL DEFAULT timezone('utc', CURRENT_TIMESTAMP),
+        created_by_id INTEGER NOT NULL REFERENCES users(id),
+        created_at TIMESTAMP DEFAULT timezone('utc', CURRENT_TIMESTAMP),
+        updated_at TIMESTAMP DEFAULT timezone('utc', CURRENT_TIMESTAMP)
+    );
+    
+    ALTER TABLE transactions ALTER COLUMN transaction_date SET DEFAULT timezone('utc', CURRENT_TIMESTAMP);
+    ALTER TABLE transactions ALTER COLUMN created_at SET DEFAULT timezone('utc', CURRENT_TIMESTAMP);
+    ALTER TABLE transactions ALTER COLUMN updated_at SET DEFAULT timezone('utc', CURRENT_TIMESTAMP);
+    
+    DROP INDEX IF EXISTS ix_transactions_id;
+    CREATE INDEX IF NOT EXISTS ix_transactions_transaction_date ON transactions (transaction_date);
+    DROP INDEX IF EXISTS ix_transactions_created_by_id;
+    CREATE INDEX IF NOT EXISTS ix_transactions_created_by_date_id ON transactions (created_by_id, transaction_date DESC, id DESC);
+"""
+
+TRANSACTION_ENTRIES_DDL = """
+    CREATE TABLE IF NOT EXISTS transaction_entries (
+        id SERIAL PRIMARY KEY,
+        debit_amount NUMERIC(18, 2) NOT NULL DEFAULT 0,
+        credit_amount NUMERIC(18, 2) NOT NULL DEFAULT 0,
+        description TEXT,
+        transaction_id INTEGER NOT NULL REFERENCES transactions(id) ON DELETE CASCADE,
+        account_id INTEGER NOT NULL REFERENCES accounts(id),
+        CONSTRAINT check_debit_xor_credit CHECK 
+            ((debit_amount > 0 AND credit_amount = 0) OR (credit_amount > 0 AND debit_amount = 0))
+    );
+    
+    -- Existing tables: store amounts as exact decimals rather than floats.
+    -- Only rewrite the table while the columns still have another type.
+    DO $$
+    BEGIN
+        IF EXISTS (
+            SELECT 1 FROM information_schema.columns
+            WHERE table_schema = current_schema()
+              AND table_name = 'transaction_entries'
+              AND column_name IN ('debit_amount', 'credit_amount')
+              AND (data_type <> 'numeric'
+                   OR numeric_precision IS DISTINCT FROM 18
+                   OR numeric_scale IS DISTINCT FROM 2)
+        ) THEN
+            ALTER TABLE transaction_entries
+                ALTER COLUMN debit_amount TYPE NUMERIC(18, 2),
+                ALTER COLUMN credit_amount TYPE NUMERIC(18, 2);
+        END IF;
+    END $$;
+    
+    DROP INDEX IF EXISTS ix_transaction_entries_id;
+    CREATE INDEX IF NOT EXISTS ix_transaction_entries_transaction_id ON transaction_entries (transaction_id);
+    CREATE INDEX IF NOT EXISTS ix_transaction_entries_account_id ON transaction_entries (account_id);
+"""
+
+# Total debits must equal total credits per transaction; checked at commit
+BALANCE_TRIGGER_DDL = """
+    CREATE OR REPLACE FUNCTION check_transaction_balanced()
+    RETURNS TRIGGER
+    LANGUAGE plpgsql
+    AS $$
+    DECLARE
+        tid INTEGER := COALESCE(NEW.transaction_id, OLD.transaction_id);
+        net NUMERIC;
+    BEGIN
+        SELECT COALESCE(SUM(debit_amount - credit_amount), 0) INTO net
+        FROM transaction_entries
+        WHERE transaction_id = tid;
+
+        IF net <> 0 THEN
+            RAISE EXCEPTION 'Transaction % is unbalanced: debits - credits = %', tid, net;
+        END IF;
+
+        RETURN NULL;
+    END;
+    $$;
+
+    DROP TRIGGER IF EXISTS trg_transaction_entries_balanced ON transaction_entries;
+    CREATE CONSTRAINT TRIGGER trg_transaction_entries_balanced
+        AFTER INSERT OR UPDATE OR DELETE ON transaction_entries
+        DEFERRABLE INITIALLY DEFERRED
+        FOR EACH ROW EXECUTE FUNCTION check_transaction_balanced();
+"""
+
+# Atomic transaction + entries insert for
+# TransactionRepository.create_transaction_with_entries (via supabase.rpc)
+CREATE_TRANSACTION_DDL = """
+    CREATE OR REPLACE FUNCTION create_transaction_with_entries(tx JSONB, entries JSONB)
+    RETURNS transactions
+    LANGUAGE plpgsql
+    AS $$
+    DECLARE
+        created transactions;
+    BEGIN
+        INSERT INTO transactions (reference_number, description, transaction_date, created_by_id)
+        VALUES (
+            tx->>'reference_number',
+            tx->>'description',
+            COALESCE((tx->>'transaction_date')::TIMESTAMP, timezone('utc', CURRENT_TIMESTAMP)),
+            (tx->>'created_by_id')::INTEGER
+        )
+        RETURNING * INTO created;
+
+        INSERT INTO transaction_entries (transaction_id, account_id, debit_amount, credit_amount, description)
+        SELECT
+            created.id,
+            (e->>'account_id')::INTEGER,
+            COALESCE((e->>'debit_amount')::NUMERIC, 0),
+            COALESCE((e->>'credit_amount')::NUMERIC, 0),
+            e->>'description'
+        FROM jsonb_array_elements(entries) AS e;
+
+        RETURN created;
+    END;
+    $$;
+"""
+
+# Account balance for AccountRepository.calculate_balance (via supabase.rpc)
+ACCOUNT_BALANCE_DDL = """
+    CREATE OR REPLACE FUNCTION account_balance(aid INTEGER)
+    RETURNS NUMERIC
+    LANGUAGE sql
+    STABLE
+    AS $$
+        SELECT COALESCE(
+            CASE (SELECT account_type FROM accounts WHERE id = aid)
+                WHEN 'asset' THEN SUM(debit_amount - credit_amount)
+                WHEN 'expense' THEN SUM(debit_amount - credit_amount)
+                ELSE SUM(credit_amount - debit_amount)
+            END,
+            0
+        )
+        FROM transaction_entries
+        WHERE account_id = aid;
+    $$;
+"""
+
+SCHEMA_DDL = (
+    ("users", USERS_DDL),
+    ("accounts", ACCOUNTS_DDL),
+    ("transactions", TRANSACTIONS_DDL),
+    ("transaction_entries", TRANSACTION_ENTRIES_DDL),
+    ("balance trigger", BALANCE_TRIGGER_DDL),
+    ("create_transaction_with_entries function", CREATE_TRANSACTION_DDL),
+    ("account_balance function", ACCOUNT_BALANCE_DDL),
+)
+
 def create_tables():
     """Create the necessary tables in Supabase."""
     try:
-        # Create users table
-        logger.info("Creating users table...")
-        supabase.table("users").execute_sql("""
-            CREATE TABLE IF NOT EXISTS users (
-                id SERIAL PRIMARY KEY,
-                username VARCHAR(255) UNIQUE NOT NULL,
-                email VARCHAR(255) UNIQUE NOT NULL,
-                password_hash VARCHAR(255) NOT NULL,
-                is_active BOOLEAN DEFAULT TRUE,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            );
-            
-            CREATE INDEX IF NOT EXISTS ix_users_username_email ON users (username, email);
-        """)
-        
-        # Create accounts table
-        logger.info("Creating accounts table...")
-        supabase.table("accounts").execute_sql("""
-            CREATE TABLE IF NOT EXISTS accounts (
-                id SERIAL PRIMARY KEY,
-                name VARCHAR(255) NOT NULL,
-                account_type VARCHAR(50) NOT NULL,
-                description TEXT,
-                owner_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                CONSTRAINT check_valid_account_type CHECK (account_type IN ('asset', 'liability', 'equity', 'revenue', 'expense'))
-            );
-            
-            CREATE INDEX IF NOT EXISTS ix_accounts_owner_id_name ON accounts (owner_id, name);
-            CREATE INDEX IF NOT EXISTS ix_accounts_account_type ON accounts (account_type);
-        """)
-        
-        # Create transactions table
-        logger.info("Creating transactions table...")
-        supabase.table("transactions").execute_sql("""
-            CREATE TABLE IF NOT EXISTS transactions (
-                id SERIAL PRIMARY KEY,
-                reference_number VARCHAR(255) UNIQUE NOT NULL,
-                description TEXT,
-                transaction_date TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
-                created_by_id INTEGER NOT NULL REFERENCES users(id),
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            );
-            
-            CREATE INDEX IF NOT EXISTS ix_transactions_transaction_date ON transactions (transaction_date);
-            CREATE INDEX IF NOT EXISTS ix_transactions_created_by_id ON transactions (created_by_id);
-        """)
-        
-        # Create transaction_entries table
-        logger.info("Creating transaction_entries table...")
-        supabase.table("transaction_entries").execute_sql("""
-            CREATE TABLE IF NOT EXISTS transaction_entries (
-                id SERIAL PRIMARY KEY,
-                debit_amount FLOAT NOT NULL DEFAULT 0.0,
-                credit_amount FLOAT NOT NULL DEFAULT 0.0,
-                description TEXT,
-                transaction_id INTEGER NOT NULL REFERENCES transactions(id) ON DELETE CASCADE,
-                account_id INTEGER NOT NULL REFERENCES accounts(id),
-                CONSTRAINT check_debit_xor_credit CHECK 
-                    ((debit_amount > 0 AND credit_amount = 0) OR (credit_amount > 0 AND debit_amount = 0))
-            );
-            
-            CREATE INDEX IF NOT EXISTS ix_transaction_entries_transaction_id ON transaction_entries (transaction_id);
-            CREATE INDEX IF NOT EXISTS ix_transaction_entries_account_id ON transaction_entries (account_id);
-        """)
+        # Every statement is idempotent, so the whole schema goes out as one
+        # batch: one round trip instead of one per table
+        logger.info(f"Creating tables: {', '.join(name for name, _ in SCHEMA_DDL)}...")
+        supabase.table("users").execute_sql("\n".join(ddl for _, ddl in SCHEMA_DDL))
         
         logger.info("All tables created successfully!")
         return True
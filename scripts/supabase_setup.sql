@@ -8,11 +8,17 @@ CREATE TABLE IF NOT EXISTS public.users (
     email VARCHAR(255) UNIQUE NOT NULL,
     password_hash VARCHAR(255) NOT NULL,
     is_active BOOLEAN DEFAULT TRUE,
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    created_at TIMESTAMP DEFAULT timezone('utc', CURRENT_TIMESTAMP),
+    updated_at TIMESTAMP DEFAULT timezone('utc', CURRENT_TIMESTAMP)
 );
 
-CREATE INDEX IF NOT EXISTS ix_users_username_email ON public.users (username, email);
+-- username and email each have a unique index; a composite one is redundant
+DROP INDEX IF EXISTS public.ix_users_username_email;
+-- Primary keys are already indexed (these exist on tables created by SQLAlchemy)
+DROP INDEX IF EXISTS public.ix_users_id;
+DROP INDEX IF EXISTS public.ix_accounts_id;
+DROP INDEX IF EXISTS public.ix_transactions_id;
+DROP INDEX IF EXISTS public.ix_transaction_entries_id;
 
 -- Create accounts table
 CREATE TABLE IF NOT EXISTS public.accounts (
@@ -21,33 +27,46 @@ CREATE TABLE IF NOT EXISTS public.accounts (
     account_type VARCHAR(50) NOT NULL,
     description TEXT,
     owner_id INTEGER NOT NULL REFERENCES public.users(id) ON DELETE CASCADE,
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    created_at TIMESTAMP DEFAULT timezone('utc', CURRENT_TIMESTAMP),
+    updated_at TIMESTAMP DEFAULT timezone('utc', CURRENT_TIMESTAMP),
     CONSTRAINT check_valid_account_type CHECK (account_type IN ('asset', 'liability', 'equity', 'revenue', 'expense'))
 );
 
-CREATE INDEX IF NOT EXISTS ix_accounts_owner_id_name ON public.accounts (owner_id, name);
-CREATE INDEX IF NOT EXISTS ix_accounts_account_type ON public.accounts (account_type);
+DROP INDEX IF EXISTS public.ix_accounts_owner_id_name;
+DROP INDEX IF EXISTS public.ix_accounts_account_type;
+CREATE UNIQUE INDEX IF NOT EXISTS ix_accounts_owner_name ON public.accounts (owner_id, name);
+CREATE INDEX IF NOT EXISTS ix_accounts_owner_type ON public.accounts (owner_id, account_type);
 
 -- Create transactions table
 CREATE TABLE IF NOT EXISTS public.transactions (
     id SERIAL PRIMARY KEY,
     reference_number VARCHAR(255) UNIQUE NOT NULL,
     description TEXT,
-    transaction_date TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    transaction_date TIMESTAMP NOT NULL DEFAULT timezone('utc', CURRENT_TIMESTAMP),
     created_by_id INTEGER NOT NULL REFERENCES public.users(id),
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    created_at TIMESTAMP DEFAULT timezone('utc', CURRENT_TIMESTAMP),
+    updated_at TIMESTAMP DEFAULT timezone('utc', CURRENT_TIMESTAMP)
 );
 
+-- Tables created before the timestamp columns had UTC server defaults
+ALTER TABLE public.transactions ALTER COLUMN transaction_date SET DEFAULT timezone('utc', CURRENT_TIMESTAMP);
+ALTER TABLE public.users ALTER COLUMN created_at SET DEFAULT timezone('utc', CURRENT_TIMESTAMP);
+ALTER TABLE public.users ALTER COLUMN updated_at SET DEFAULT timezone('utc', CURRENT_TIMESTAMP);
+ALTER TABLE public.accounts ALTER COLUMN created_at SET DEFAULT timezone('utc', CURRENT_TIMESTAMP);
+ALTER TABLE public.accounts ALTER COLUMN updated_at SET DEFAULT timezone('utc', CURRENT_TIMESTAMP);
+ALTER TABLE public.transactions ALTER COLUMN created_at SET DEFAULT timezone('utc', CURRENT_TIMESTAMP);
+ALTER TABLE public.transactions ALTER COLUMN updated_at SET DEFAULT timezone('utc', CURRENT_TIMESTAMP);
+
 CREATE INDEX IF NOT EXISTS ix_transactions_transaction_date ON public.transactions (transaction_date);
-CREATE INDEX IF NOT EXISTS ix_transactions_created_by_id ON public.transactions (created_by_id);
+-- Covered by the leading column of ix_transactions_created_by_date_id
+DROP INDEX IF EXISTS public.ix_transactions_created_by_id;
+CREATE INDEX IF NOT EXISTS ix_transactions_created_by_date_id ON public.transactions (created_by_id, transaction_date DESC, id DESC);
 
 -- Create transaction_entries table
 CREATE TABLE IF NOT EXISTS public.transaction_entries (
     id SERIAL PRIMARY KEY,
-    debit_amount FLOAT NOT NULL DEFAULT 0.0,
-    credit_amount FLOAT NOT NULL DEFAULT 0.0,
+    debit_amount NUMERIC(18, 2) NOT NULL DEFAULT 0,
+    credit_amount NUMERIC(18, 2) NOT NULL DEFAULT 0,
     description TEXT,
     transaction_id INTEGER NOT NULL REFERENCES public.transactions(id) ON DELETE CASCADE,
     account_id INTEGER NOT NULL REFERENCES public.accounts(id),
@@ -55,9 +74,110 @@ CREATE TABLE IF NOT EXISTS public.transaction_entries (
         ((debit_amount > 0 AND credit_amount = 0) OR (credit_amount > 0 AND debit_amount = 0))
 );
 
+-- Existing databases: store amounts as exact decimals rather than floats.
+-- Only rewrite the table while the columns still have another type.
+DO $$
+BEGIN
+    IF EXISTS (
+        SELECT 1 FROM information_schema.columns
+        WHERE table_schema = 'public'
+          AND table_name = 'transaction_entries'
+          AND column_name IN ('debit_amount', 'credit_amount')
+          AND (data_type <> 'numeric'
+               OR numeric_precision IS DISTINCT FROM 18
+               OR numeric_scale IS DISTINCT FROM 2)
+    ) THEN
+        ALTER TABLE public.transaction_entries
+            ALTER COLUMN debit_amount TYPE NUMERIC(18, 2),
+            ALTER COLUMN credit_amount TYPE NUMERIC(18, 2);
+    END IF;
+END $$;
+
 CREATE INDEX IF NOT EXISTS ix_transaction_entries_transaction_id ON public.transaction_entries (transaction_id);
 CREATE INDEX IF NOT EXISTS ix_transaction_entries_account_id ON public.transaction_entries (account_id);
 
+-- Enforce the double-entry invariant (total debits = total credits) per transaction.
+-- The trigger is deferred to commit time so all entries of a transaction can be
+-- written in one database transaction before the balance is checked.
+CREATE OR REPLACE FUNCTION public.check_transaction_balanced()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    tid INTEGER := COALESCE(NEW.transaction_id, OLD.transaction_id);
+    net NUMERIC;
+BEGIN
+    SELECT COALESCE(SUM(debit_amount - credit_amount), 0) INTO net
+    FROM public.transaction_entries
+    WHERE transaction_id = tid;
+
+    IF net <> 0 THEN
+        RAISE EXCEPTION 'Transaction % is unbalanced: debits - credits = %', tid, net;
+    END IF;
+
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS trg_transaction_entries_balanced ON public.transaction_entries;
+CREATE CONSTRAINT TRIGGER trg_transaction_entries_balanced
+    AFTER INSERT OR UPDATE OR DELETE ON public.transaction_entries
+    DEFERRABLE INITIALLY DEFERRED
+    FOR EACH ROW EXECUTE FUNCTION public.check_transaction_balanced();
+
+-- Create a transaction and its entries atomically in one call (via
+-- supabase.rpc). Both inserts run in the function's database transaction,
+-- so a failed entry insert or an unbalanced set of entries rolls back the
+-- transaction row as well.
+CREATE OR REPLACE FUNCTION public.create_transaction_with_entries(tx JSONB, entries JSONB)
+RETURNS public.transactions
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    created public.transactions;
+BEGIN
+    INSERT INTO public.transactions (reference_number, description, transaction_date, created_by_id)
+    VALUES (
+        tx->>'reference_number',
+        tx->>'description',
+        COALESCE((tx->>'transaction_date')::TIMESTAMP, timezone('utc', CURRENT_TIMESTAMP)),
+        (tx->>'created_by_id')::INTEGER
+    )
+    RETURNING * INTO created;
+
+    INSERT INTO public.transaction_entries (transaction_id, account_id, debit_amount, credit_amount, description)
+    SELECT
+        created.id,
+        (e->>'account_id')::INTEGER,
+        COALESCE((e->>'debit_amount')::NUMERIC, 0),
+        COALESCE((e->>'credit_amount')::NUMERIC, 0),
+        e->>'description'
+    FROM jsonb_array_elements(entries) AS e;
+
+    RETURN created;
+END;
+$$;
+
+-- Account balance, aggregated where the entries live so callers (via
+-- supabase.rpc) receive one number instead of every entry row.
+-- Asset and expense accounts: debit - credit; all others: credit - debit.
+CREATE OR REPLACE FUNCTION public.account_balance(aid INTEGER)
+RETURNS NUMERIC
+LANGUAGE sql
+STABLE
+AS $$
+    SELECT COALESCE(
+        CASE (SELECT account_type FROM public.accounts WHERE id = aid)
+            WHEN 'asset' THEN SUM(debit_amount - credit_amount)
+            WHEN 'expense' THEN SUM(debit_amount - credit_amount)
+            ELSE SUM(credit_amount - debit_amount)
+        END,
+        0
+    )
+    FROM public.transaction_entries
+    WHERE account_id = aid;
+$$;
+
 -- Enable Row Level Security (RLS)
 ALTER TABLE public.users ENABLE ROW LEVEL SECURITY;
 ALTER TABLE public.accounts ENABLE ROW LEVEL SECURITY;
@@ -13,7 +13,9 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 # Load environment variables from .env file
 load_dotenv()
 
-from app.core.supabase_client import supabase, SUPABASE_URL
+from app.core.supabase_client import get_supabase, SUPABASE_URL
+
+supabase = get_supabase()
 
 # Configure logging
 logging.basicConfig(
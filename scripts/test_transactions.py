@@ -4,11 +4,12 @@ Script to test the transactions functionality with Supabase integration.
 """
 import os
 import sys
-import json
+import asyncio
 import logging
-import requests
 import uuid
-from datetime import datetime
+import httpx
+import orjson
+from datetime import datetime, timezone
 from dotenv import load_dotenv
 
 # Add the parent directory to the path so we can import from app
@@ -26,17 +27,22 @@ logger = logging.getLogger(__name__)
 
 # API URL
 BASE_URL = "http://127.0.0.1:8000"
+JSON_HEADERS = {"Content-Type": "application/json"}
 
-def get_token(username, password):
+async def post_json(client, url, data):
+    """POST a JSON body, encoded with orjson rather than the stdlib json module."""
+    return await client.post(url, content=orjson.dumps(data), headers=JSON_HEADERS)
+
+async def get_token(client, username, password):
     """Get an authentication token."""
-    token_url = f"{BASE_URL}/auth/token"
+    token_url = "/auth/token"
     data = {
         "username": username,
         "password": password
     }
     
     logger.info(f"Attempting to authenticate with username: {username}")
-    response = requests.post(token_url, data=data)
+    response = await client.post(token_url, data=data)
     
     if response.status_code == 200:
         token_data = response.json()
@@ -46,9 +52,9 @@ def get_token(username, password):
         logger.error(f"Authentication failed: {response.text}")
         return None
 
-def create_user(username, email, password):
+async def create_user(client, username, email, password):
     """Create a new user."""
-    users_url = f"{BASE_URL}/users/"
+    users_url = "/users/"
     data = {
         "username": username,
         "email": email,
@@ -56,7 +62,7 @@ def create_user(username, email, password):
     }
     
     logger.info(f"Attempting to create user: {username}")
-    response = requests.post(users_url, json=data)
+    response = await post_json(client, users_url, data)
     
     if response.status_code == 200 or response.status_code == 201:
         logger.info(f"User created: {username}")
@@ -65,13 +71,9 @@ def create_user(username, email, password):
         logger.error(f"Failed to create user: {response.text}")
         return None
 
-def create_account(token, name, account_type, description=None):
+async def create_account(client, name, account_type, description=None):
     """Create a new account."""
-    accounts_url = f"{BASE_URL}/accounts/"
-    headers = {
-        "Authorization": f"Bearer {token}",
-        "Content-Type": "application/json"
-    }
+    accounts_url = "/accounts/"
     data = {
         "name": name,
         "account_type": account_type,
@@ -79,7 +81,7 @@ def create_account(token, name, account_type, description=None):
     }
     
     logger.info(f"Attempting to create account: {name}")
-    response = requests.post(accounts_url, headers=headers, json=data)
+    response = await post_json(client, accounts_url, data)
     
     if response.status_code == 200 or response.status_code == 201:
         logger.info(f"Account created: {name}")
@@ -88,15 +90,12 @@ def create_account(token, name, account_type, description=None):
         logger.error(f"Failed to create account: {response.text}")
         return None
 
-def get_accounts(token):
+async def get_accounts(client):
     """Get all accounts for the current user."""
-    accounts_url = f"{BASE_URL}/accounts/"
-    headers = {
-        "Authorization": f"Bearer {token}"
-    }
+    accounts_url = "/accounts/"
     
     logger.info("Retrieving accounts")
-    response = requests.get(accounts_url, headers=headers)
+    response = await client.get(accounts_url)
     
     if response.status_code == 200:
         accounts = response.json()
@@ -106,22 +105,18 @@ def get_accounts(token):
         logger.error(f"Failed to get accounts: {response.text}")
         return []
 
-def create_transaction(token, reference_number, description, entries):
-    """Create a new transaction with entries."""
-    transactions_url = f"{BASE_URL}/transactions/"
-    headers = {
-        "Authorization": f"Bearer {token}",
-        "Content-Type": "application/json"
-    }
+async def create_transaction(client, reference_number, description, entries, transaction_date):
+    """Create a new transaction with entries, dated with an ISO 8601 string."""
+    transactions_url = "/transactions/"
     data = {
         "reference_number": reference_number,
         "description": description,
-        "transaction_date": datetime.utcnow().isoformat(),
+        "transaction_date": transaction_date,
         "entries": entries
     }
     
     logger.info(f"Attempting to create transaction: {reference_number}")
-    response = requests.post(transactions_url, headers=headers, json=data)
+    response = await post_json(client, transactions_url, data)
     
     if response.status_code == 200 or response.status_code == 201:
         logger.info(f"Transaction created: {reference_number}")
@@ -130,15 +125,12 @@ def create_transaction(token, reference_number, description, entries):
         logger.error(f"Failed to create transaction: {response.text}")
         return None
 
-def get_account_balance(token, account_id):
+async def get_account_balance(client, account_id):
     """Get the balance of an account."""
-    balance_url = f"{BASE_URL}/accounts/{account_id}/balance"
-    headers = {
-        "Authorization": f"Bearer {token}"
-    }
+    balance_url = f"/accounts/{account_id}/balance"
     
     logger.info(f"Retrieving balance for account: {account_id}")
-    response = requests.get(balance_url, headers=headers)
+    response = await client.get(balance_url)
     
     if response.status_code == 200:
         balance_data = response.json()
@@ -148,8 +140,15 @@ def get_account_balance(token, account_id):
         logger.error(f"Failed to get account balance: {response.text}")
         return None
 
-def main():
+async def main():
     """Main function to test transactions functionality."""
+    # One client for the whole run, so every request reuses a pooled
+    # keep-alive connection instead of opening a new one
+    async with httpx.AsyncClient(base_url=BASE_URL) as client:
+        await run_checks(client)
+
+async def run_checks(client):
+    """Create a user, accounts and a transaction, then check the balances."""
     # Generate a unique username to avoid conflicts
     unique_id = str(uuid.uuid4())[:8]
     username = f"testuser_{unique_id}"
@@ -159,32 +158,36 @@ def main():
     logger.info(f"Testing with unique user: {username}")
     
     # Create a test user
-    user = create_user(username, email, password)
+    user = await create_user(client, username, email, password)
     if not user:
         logger.error("Failed to create test user. Cannot proceed with tests.")
         return
     
     # Get authentication token
-    token = get_token(username, password)
+    token = await get_token(client, username, password)
     
     if not token:
         logger.error("Authentication failed. Cannot proceed with tests.")
         return
     
     logger.info("Authentication successful!")
+    client.headers["Authorization"] = f"Bearer {token}"
     
-    # Create accounts
-    cash_account = create_account(token, "Cash", "asset", "Cash on hand")
+    # Create accounts; neither depends on the other
+    cash_account, expense_account = await asyncio.gather(
+        create_account(client, "Cash", "asset", "Cash on hand"),
+        create_account(client, "Office Supplies", "expense", "Office supplies expenses")
+    )
     if not cash_account:
         logger.error("Failed to create Cash account. Cannot proceed with tests.")
         return
     
-    expense_account = create_account(token, "Office Supplies", "expense", "Office supplies expenses")
     if not expense_account:
         logger.error("Failed to create Office Supplies account. Cannot proceed with tests.")
         return
     
-    # Create a test transaction
+    # Create a test transaction; its date and reference come from one timestamp
+    now = datetime.now(timezone.utc)
     entries = [
         {
             "account_id": cash_account["id"],
@@ -200,24 +203,27 @@ def main():
         }
     ]
     
-    transaction = create_transaction(
-        token,
-        f"TX-{datetime.utcnow().strftime('%Y%m%d%H%M%S')}",
+    transaction = await create_transaction(
+        client,
+        f"TX-{now:%Y%m%d%H%M%S}",
         "Purchase of office supplies",
-        entries
+        entries,
+        now.isoformat()
     )
     
     if not transaction:
         logger.error("Failed to create test transaction.")
         return
     
-    # Check account balances
-    cash_balance = get_account_balance(token, cash_account["id"])
-    expense_balance = get_account_balance(token, expense_account["id"])
+    # Check account balances; the two requests are independent
+    cash_balance, expense_balance = await asyncio.gather(
+        get_account_balance(client, cash_account["id"]),
+        get_account_balance(client, expense_account["id"])
+    )
     
     logger.info("Test completed successfully!")
     logger.info(f"Cash account balance: {cash_balance['balance'] if cash_balance else 'Unknown'}")
     logger.info(f"Expense account balance: {expense_balance['balance'] if expense_balance else 'Unknown'}")
 
 if __name__ == "__main__":
-    main()
+    asyncio.run(main())